@@ -0,0 +1,310 @@
+import csv
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+import datetime
+import platform
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+# Scripts I have made
+import costs
+import reportRunner
+import itemManager
+import dateParser
+
+# The columns of an ebay transaction report that the scripts use
+REPORT_HEADER = ['Transaction creation date', 'Type', 'Order number', 'Legacy order ID', 'Buyer username', 'Buyer name',
+                 'Buyer City', 'Buyer State', 'Buyer zip', 'Buyer country', 'Item ID', 'Item title', 'Quantity',
+                 'Item subtotal', 'Shipping and handling', 'Final Value Fee - fixed', 'Final Value Fee - variable',
+                 'Gross transaction amount']
+
+# Transaction types in the generated reports and how often each one shows up
+REPORT_TYPES = ['Order', 'Payout', 'Refund', 'Shipping label', 'Other fee']
+REPORT_TYPE_WEIGHTS = [0.8, 0.05, 0.05, 0.05, 0.05]
+
+BUYER_LOCATIONS = [['NY', 'Brooklyn'], ['NY', 'Albany'], ['CA', 'Los Angeles'], ['CA', 'San Francisco'], ['TX', 'Austin'],
+                   ['FL', 'Miami'], ['WA', 'Seattle'], ['IL', 'Chicago']]
+
+# The generated orders are spread over these dates, and the benchmarks run as of the last one
+FIRST_ORDER_DATE = datetime.date(2021, 1, 1)
+LAST_ORDER_DATE = datetime.date(2025, 12, 31)
+
+# The date the costs in the generated lookup table change
+COST_CHANGE_DATE = '2023-06-30'
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    generate_reports                                                        *
+*                                                                                           *
+* Description:      Writes synthetic ebay transaction reports in the same format as the real *
+*                   ones (11 metadata rows, then the transactions) to out_dir/ebay_reports/, *
+*                   plus a lookup table, alias table and costs csv for the items in them.   *
+*                   Each report covers the next stretch of dates. Most items get two costs, *
+*                   a few are ignored, a few have no cost yet, and a few are sold under an  *
+*                   alias                                                                   *
+*                                                                                           *
+* Parameters:       str out_dir         :   Directory to write the files to, must end in /  *
+*                   int num_orders      :   Number of transactions to generate              *
+*                   int num_items       :   Number of different items                       *
+*                   int num_reports     :   Number of report files to split them into       *
+*                   int seed            :   Seed for the random numbers                     *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def generate_reports(out_dir, num_orders, num_items, num_reports=12, seed=0):
+    rng = np.random.default_rng(seed)
+
+    items = np.array(['Item %d' % i for i in range(num_items)], dtype=object)
+
+    # Every 20th item is also sold under a second name that points to it in the alias table
+    aliased = items[::20]
+    titles = np.concatenate([items, np.array([item + ' v2' for item in aliased], dtype=object)])
+
+    # Order dates sorted so each report gets the next stretch of them. The strings for each day are
+    # made once and then picked from
+    num_days = (LAST_ORDER_DATE - FIRST_ORDER_DATE).days + 1
+    day_strings = np.array([(FIRST_ORDER_DATE + datetime.timedelta(i)).strftime('%b %d, %Y') for i in range(num_days)], dtype=object)
+    days = np.sort(rng.integers(0, num_days, num_orders))
+
+    subtotals = np.round(rng.uniform(5, 60, num_orders), 2)
+    locations = rng.integers(0, len(BUYER_LOCATIONS), num_orders)
+
+    orders = pd.DataFrame({
+        'Transaction creation date': day_strings[days],
+        'Type': np.array(REPORT_TYPES, dtype=object)[rng.choice(len(REPORT_TYPES), num_orders, p=REPORT_TYPE_WEIGHTS)],
+        'Order number': ['%d-%d' % (i, i) for i in range(100000, 100000 + num_orders)],
+        'Legacy order ID': 'x',
+        'Buyer username': 'user',
+        'Buyer name': 'name',
+        'Buyer City': np.array([city for state, city in BUYER_LOCATIONS], dtype=object)[locations],
+        'Buyer State': np.array([state for state, city in BUYER_LOCATIONS], dtype=object)[locations],
+        'Buyer zip': '00000',
+        'Buyer country': 'US',
+        'Item ID': '1',
+        'Item title': titles[rng.integers(0, len(titles), num_orders)],
+        'Quantity': 1,
+        'Item subtotal': subtotals,
+        'Shipping and handling': np.round(rng.uniform(0, 5, num_orders), 2),
+        'Final Value Fee - fixed': -0.3,
+        'Final Value Fee - variable': np.round(-subtotals * 0.13, 2),
+        'Gross transaction amount': subtotals,
+    }, columns=REPORT_HEADER)
+
+    os.makedirs(out_dir + 'ebay_reports', exist_ok=True)
+    for i, report in enumerate(np.array_split(np.arange(num_orders), num_reports)):
+        with open(out_dir + 'ebay_reports/report_%d.csv' % i, 'w', newline='') as outfile:
+            for line in range(11):
+                outfile.write('Generated report metadata %d\n' % line)
+            orders.iloc[report].to_csv(outfile, index=False)
+
+    with open(out_dir + 'item_lookup_table.csv', 'w', newline='') as outfile:
+        outcsv = csv.writer(outfile, delimiter=',', quotechar='"')
+        outcsv.writerow(['Item', 'Cost', 'Start Date', 'End Date'])
+        for i, item in enumerate(items):
+            # Leave every 50th item out so it has no cost yet, and ignore every 30th
+            if i % 50 == 49:
+                continue
+            if i % 30 == 29:
+                outcsv.writerow([item, '-1', '2000-1-1', 'present'])
+                continue
+
+            cost = 1 + (i % 40) * 0.5
+            outcsv.writerow([item, '%.2f' % cost, '2000-01-01', COST_CHANGE_DATE])
+            outcsv.writerow([item, '%.2f' % (cost + 0.5), COST_CHANGE_DATE, 'present'])
+
+    with open(out_dir + 'item_alias_table.csv', 'w', newline='') as outfile:
+        outcsv = csv.writer(outfile, delimiter=',', quotechar='"')
+        outcsv.writerow(['Item', 'Alias'])
+        for item in aliased:
+            outcsv.writerow([item + ' v2', item])
+
+    with open(out_dir + 'costs.csv', 'w', newline='') as outfile:
+        outcsv = csv.writer(outfile, delimiter=',', quotechar='"')
+        outcsv.writerow(['Date', 'Website', 'Item', 'Cost/unit', 'Has tax', 'Tax', 'Total cost', 'Quantity', 'Total'])
+        for i in range(max(num_orders // 100, 1)):
+            date = FIRST_ORDER_DATE + datetime.timedelta(int(rng.integers(0, num_days)))
+            outcsv.writerow([date.strftime('%m/%d/%Y'), 'amazon', 'Material %d' % (i % 20), '2.00', 'y', '0.12', '2.12', '3', '6.36'])
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    time_call                                                               *
+*                                                                                           *
+* Description:      Calls a function, timing it and adding the time to a list of results.   *
+*                   If tracemalloc is tracing, the peak memory of the call is added too:    *
+*                   the most memory allocated during the call on top of what was allocated  *
+*                   before it, so each step gets its own peak                               *
+*                                                                                           *
+* Parameters:       [dict]   results    :   Where the result gets added                     *
+*                   str      name       :   The name of the benchmark                       *
+*                   function func       :   The function to time                            *
+*                   args                :   Arguments for func                              *
+*                                                                                           *
+* Return Value:     The return value of func                                                *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def time_call(results, name, func, *args):
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    value = func(*args)
+    seconds = time.perf_counter() - start
+
+    peak_memory = None
+    if tracing:
+        peak_memory = tracemalloc.get_traced_memory()[1] - start_memory
+
+    results.append({'name': name, 'seconds': seconds, 'peak_memory': peak_memory})
+    if tracing:
+        print(name + ':', round(seconds, 3), 's,', round(peak_memory / 2**20, 1), 'MB')
+    else:
+        print(name + ':', round(seconds, 3), 's')
+
+    return value
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    run_benchmarks                                                          *
+*                                                                                           *
+* Description:      Generates reports in work_dir, then times updating the database,        *
+*                   creating a StatsGen, running the reports (the monthly and relative      *
+*                   reports are all made in the one pass of run_reports), and looking up    *
+*                   costs one at a time with get_cost and all at once with get_costs. The   *
+*                   benchmarks run as of LAST_ORDER_DATE so runs can be compared. With      *
+*                   trace_memory the peak memory of each step is found with tracemalloc,    *
+*                   which makes every step several times slower, so the times of those runs *
+*                   should only be compared with each other                                 *
+*                                                                                           *
+* Parameters:       str work_dir        :   Directory to generate the reports in, must end  *
+*                                           in /                                            *
+*                   int num_orders      :   Number of transactions to generate              *
+*                   int num_items       :   Number of different items                       *
+*                   int num_lookups     :   Number of costs to look up                      *
+*                   int seed            :   Seed for the random numbers                     *
+*                   bool trace_memory   :   Find the peak memory of each step               *
+*                                                                                           *
+* Return Value:     dict    :   The parameters of the run and the result of each benchmark  *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def run_benchmarks(work_dir, num_orders, num_items, num_lookups=100000, seed=0, trace_memory=False):
+    run_context = dateParser.RunContext(LAST_ORDER_DATE)
+    dateParser.set_run_context(run_context)
+
+    results = []
+    if trace_memory:
+        tracemalloc.start()
+
+    time_call(results, 'generate_reports', generate_reports, work_dir, num_orders, num_items, 12, seed)
+
+    time_call(results, 'update_csv_database', reportRunner.update_csv_database, work_dir + 'ebay_reports/', 'ebay.csv', work_dir)
+
+    with open(work_dir + 'ebay.csv', 'r') as infile:
+        incsv = csv.reader(infile, delimiter=',', quotechar='"')
+        inheader = incsv.__next__()
+        table = [row for row in incsv]
+
+    item_man = itemManager.ItemManager(inheader, csv_dir=work_dir, run_context=run_context)
+
+    stats = time_call(results, 'StatsGen', reportRunner.StatsGen, inheader, table, item_man, run_context)
+    stats.set_daily_costs(costs.DailyCosts(costs.CostsLedger(work_dir)))
+    time_call(results, 'run_reports', stats.run_reports)
+
+    # Look up random orders from the database
+    rng = np.random.default_rng(seed)
+    title_i = inheader.index('Item title')
+    date_i = inheader.index('Transaction creation date')
+    rows = [table[i] for i in rng.integers(0, len(table), min(num_lookups, len(table)))]
+    items = [row[title_i] for row in rows]
+    dates = [row[date_i] for row in rows]
+
+    def lookup_costs():
+        for item, date in zip(items, dates):
+            item_man.get_cost(item, date)
+
+    time_call(results, 'get_cost', lookup_costs)
+    time_call(results, 'get_costs', item_man.get_costs, items, dates)
+
+    if trace_memory:
+        tracemalloc.stop()
+
+    return {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'num_orders': num_orders,
+        'num_items': num_items,
+        'num_lookups': len(rows),
+        'database_orders': len(table),
+        'trace_memory': trace_memory,
+        'results': results,
+    }
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    save_results                                                            *
+*                                                                                           *
+* Description:      Adds the results of a run to a json file holding a list of every run    *
+*                                                                                           *
+* Parameters:       str  path   :   Path of the results file                                *
+*                   dict run    :   The results from run_benchmarks                         *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def save_results(path, run):
+    runs = []
+    if os.path.isfile(path):
+        with open(path, 'r') as infile:
+            runs = json.load(infile)
+
+    runs.append(run)
+
+    with open(path, 'w') as outfile:
+        json.dump(runs, outfile, indent=1)
+
+if __name__ == "__main__":
+    # --orders N and --items N set the size of the generated reports, --lookups N the number of
+    # costs looked up, --output the results file and --dir where to generate the reports. The
+    # generated files get deleted afterwards unless --dir is given. --memory finds the peak memory
+    # of each step, which slows every step down
+    def get_arg(flag, default):
+        if flag in sys.argv:
+            return sys.argv[sys.argv.index(flag) + 1]
+        return default
+
+    num_orders = int(get_arg('--orders', 10000))
+    num_items = int(get_arg('--items', 100))
+    num_lookups = int(get_arg('--lookups', 100000))
+    output = get_arg('--output', 'benchmark_results.json')
+
+    work_dir = get_arg('--dir', None)
+    keep_files = work_dir is not None
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix='ebay_benchmark_')
+    work_dir = os.path.join(work_dir, '')
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        run = run_benchmarks(work_dir, num_orders, num_items, num_lookups, trace_memory='--memory' in sys.argv)
+    finally:
+        if not keep_files:
+            shutil.rmtree(work_dir)
+
+    save_results(output, run)
+    print('Results added to', output)
@@ -2,6 +2,9 @@ import csv
 from datetime import date 
 import os
 
+# Scripts I have made
+import dateParser
+
 '''
 * ***************************************************************************************** *
 *                                                                                           *
@@ -52,6 +55,196 @@ def write_csv(csv_dir, csv_filename, header, dataset):
 
     outfile.close()
 
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Class name:       CostsLedger                                                             *
+*                                                                                           *
+* Description:      Keeps the business costs csv in memory along with an index of the last  *
+*                   purchase of each item and the running total of all costs. New rows are  *
+*                   appended to the end of the csv as they are added instead of the whole    *
+*                   file being written out again                                            *
+*                                                                                           *
+* Parameters:      str csv_dir      : The directory to look for the csv file                *
+*                  str csv_filename : Filename of the csv file                              *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+class CostsLedger:
+    def __init__(self, csv_dir='./', csv_filename='costs.csv'):
+        self.csv_dir = csv_dir
+        self.csv_filename = csv_filename
+
+        self.header, self.dataset = get_costs_dataset(csv_dir, csv_filename)
+        if not self.header:
+            self.header = ['Date', 'Website', 'Item', 'Cost/unit', 'Has tax', 'Tax', 'Total cost', 'Quantity', 'Total']
+
+        self.item_i = self.header.index('Item')
+        self.website_i = self.header.index('Website')
+        self.total_i = self.header.index('Total')
+
+        # The position in self.dataset of the last purchase of each item
+        self.last_purchase = {}
+
+        # The total of all costs, kept up to date as rows are added
+        self.total = 0.0
+
+        for pos, row in enumerate(self.dataset):
+            self.index_row(pos, row)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    index_row                                                               *
+    *                                                                                           *
+    * Description:      Adds a row to the last purchase index and the running total             *
+    *                                                                                           *
+    * Parameters:       int   pos   :   The position of the row in self.dataset                 *
+    *                   [str] row   :   A row of the costs csv                                  *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def index_row(self, pos, row):
+        self.last_purchase[str(row[self.item_i]).strip()] = pos
+
+        try:
+            self.total += float(row[self.total_i])
+        except (TypeError, ValueError):
+            print('No valid data for field "Total" on line ', pos)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    append_row                                                              *
+    *                                                                                           *
+    * Description:      Adds a row to the ledger and appends it to the end of the csv file,     *
+    *                   writing the header first if the file does not exist yet                 *
+    *                                                                                           *
+    * Parameters:       [str] row   :   A row of data for the csv file                          *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def append_row(self, row):
+        path = self.csv_dir + self.csv_filename
+        new_file = not os.path.isfile(path) or os.path.getsize(path) == 0
+
+        with open(path, 'a', newline='') as outfile:
+            outcsv = csv.writer(outfile, delimiter=',', quotechar='"')
+            if new_file:
+                outcsv.writerow(self.header)
+            outcsv.writerow(row)
+
+        self.dataset.append(row)
+        self.index_row(len(self.dataset) - 1, row)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_items                                                               *
+    *                                                                                           *
+    * Description:      Returns the name of every item that has been purchased, sorted          *
+    *                                                                                           *
+    * Return Value:     [str]                                                                   *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_items(self):
+        return sorted(self.last_purchase)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_last_purchase                                                       *
+    *                                                                                           *
+    * Description:      Returns the row of the last purchase of an item                         *
+    *                                                                                           *
+    * Parameters:       str item_name   :   The item to look up                                 *
+    *                                                                                           *
+    * Return Value:     [str]   :   The row, None if the item has not been purchased            *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_last_purchase(self, item_name):
+        pos = self.last_purchase.get(item_name.strip())
+        if pos is None:
+            return None
+
+        return self.dataset[pos]
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Class name:       DailyCosts                                                              *
+*                                                                                           *
+* Description:      The costs of a ledger added up by day, stored as a running sum over     *
+*                   every day from the first purchase to the last one. The costs of any     *
+*                   range of dates are then found with a single subtraction. Rows with a    *
+*                   date that can not be read are only counted in self.total, the total of  *
+*                   the whole ledger                                                        *
+*                                                                                           *
+* Parameters:      CostsLedger ledger   : The costs to add up                               *
+*                  str         date_fmt : The strptime format of the Date column            *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+class DailyCosts:
+    def __init__(self, ledger, date_fmt='%m/%d/%Y'):
+        date_i = ledger.header.index('Date')
+
+        # The same as the ledger's total, no matter the date of each cost
+        self.total = ledger.total
+
+        day_totals = {}
+        for pos, row in enumerate(ledger.dataset):
+            try:
+                total = float(row[ledger.total_i])
+            except (TypeError, ValueError):
+                continue # Already reported by CostsLedger.index_row
+
+            try:
+                day = dateParser.parse_date(str(row[date_i]).strip(), date_fmt).toordinal()
+            except ValueError:
+                print('No valid data for field "Date" on line ', pos, ', the cost is only in the all time total')
+                continue
+
+            day_totals[day] = day_totals.get(day, 0.0) + total
+
+        # self.prefix_sums[i] is the total of every day before self.first_day + i
+        self.first_day = min(day_totals) if day_totals else 0
+        last_day = max(day_totals) if day_totals else -1
+
+        self.prefix_sums = [0.0]
+        for day in range(self.first_day, last_day + 1):
+            self.prefix_sums.append(self.prefix_sums[-1] + day_totals.get(day, 0.0))
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_total                                                               *
+    *                                                                                           *
+    * Description:      Returns the total of the costs between two dates                        *
+    *                                                                                           *
+    * Parameters:       datetime date start_date    :   The first day(inclusive) to count       *
+    *                   datetime date end_date      :   The last day(inclusive) to count        *
+    *                                                                                           *
+    * Return Value:     float                                                                   *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_total(self, start_date, end_date):
+        num_days = len(self.prefix_sums) - 1
+        start = min(max(start_date.toordinal() - self.first_day, 0), num_days)
+        end = min(max(end_date.toordinal() - self.first_day + 1, 0), num_days)
+
+        if end <= start:
+            return 0.0
+
+        return self.prefix_sums[end] - self.prefix_sums[start]
+
 '''
 * ***************************************************************************************** *
 *                                                                                           *
@@ -59,16 +252,14 @@ def write_csv(csv_dir, csv_filename, header, dataset):
 *                                                                                           *
 * Description:      Launches into an interactive prompt to enter a transaction into the csv *
 *                                                                                           *
-* Parameters:       [str] inheader  :   header for the csv file                             *
-*                   [[str]] dataset :   The data to write to the csv                        *
+* Parameters:       CostsLedger ledger  :   The costs the item is being added to            *
 *                                                                                           *
 * Return Value:     [str] row       :   A row of data for the csv file                      *
 *                                                                                           *
 * ***************************************************************************************** *
 '''
-def get_item_row(inheader, indataset):
-    items = list(set([row[inheader.index('Item')].strip() for row in indataset]))
-    items.sort()
+def get_item_row(ledger):
+    items = ledger.get_items()
     print('Existing items:')
 
     for i, item in enumerate(items):
@@ -101,11 +292,9 @@ def get_item_row(inheader, indataset):
     old_website = '' 
     # If the item already exists in the costs csv, look up the website that it was purchased at
     if old_item:
-        website_i = inheader.index('Website')
-        item_name_i = inheader.index('Item')
-        for row in indataset:
-            if (row[item_name_i] == item_name):
-                old_website = row[website_i]
+        last_purchase = ledger.get_last_purchase(item_name)
+        if last_purchase is not None:
+            old_website = last_purchase[ledger.website_i]
 
     # This gets hit if we're entering a new item, or for some reason we could not look up the
     # website used the last time the item was purchased
@@ -153,18 +342,16 @@ def get_item_row(inheader, indataset):
 * Function name:    run                                                                     *
 *                                                                                           *
 * Description:      Launches into an interactive prompt to enter an arbitrary number of     *
-*                   transactions into the csv. Also writes out the csv to disk              *
+*                   transactions into the csv. Each transaction is appended to the csv as   *
+*                   soon as it is confirmed                                                 *
 *                                                                                           *
-* Parameters:       str csv_dir     :   Directory where the csv will be stored              *
-*                   str csv_filename:   Filename of the csv file                            *
-*                   [str] inheader  :   header for the csv file                             *
-*                   [[str]] dataset :   The data to write to the csv                        *
+* Parameters:       CostsLedger ledger  :   The costs to add the transactions to            *
 *                                                                                           *
 * Return Value:     none                                                                    *
 *                                                                                           *
 * ***************************************************************************************** *
 '''
-def run(csv_dir, csv_filename, header, dataset):
+def run(ledger):
     menu = '''
     Commands:
         add - add an item
@@ -182,17 +369,15 @@ def run(csv_dir, csv_filename, header, dataset):
 
         elif cmd == 'add':
             # Date,Website,Item,Cost/unit,Has tax,Tax,Total cost,Quantity,Total,
-            new_row = get_item_row(header, dataset)
+            new_row = get_item_row(ledger)
             print(new_row)
             confirm = input('Does this look right? (y/n) >> ')
 
             if confirm == 'y':
-                indataset.append(new_row)
+                ledger.append_row(new_row)
         
         elif cmd == 'sum':
-            print('Total costs: ', sum_costs(header, dataset))
-
-    write_csv(csv_dir, csv_filename, inheader, indataset)
+            print('Total costs: ', ledger.total)
 
 '''
 * ***************************************************************************************** *
@@ -224,5 +409,4 @@ if __name__ == "__main__":
     csv_filename = 'costs.csv'
     csv_file_dir = './'
 
-    inheader, indataset = get_costs_dataset(csv_file_dir, csv_filename)
-    run(csv_file_dir, csv_filename, inheader, indataset)
+    run(CostsLedger(csv_file_dir, csv_filename))
@@ -1,48 +1,181 @@
 import csv
-import datetime
-
-# Takes in a filename to a csv file. It then opens the csv
-# and converts every value in col_num in date format in_fmt
-# to the format defined in out_fmt
-def fix_date_format(filename, col_num, in_fmt, out_fmt):
-    infile = open(filename, 'r')
-    incsv = csv.reader(infile, delimiter=',', quotechar='"')
-    inheader = incsv.__next__() 
-
-    out_table = []
-    out_table.append(inheader)
-
-    for i, row in enumerate(incsv):
-        try:
-            indate = datetime.datetime.strptime(row[col_num], in_fmt).date()
-            outdate = indate.strftime(out_fmt)
-
-            temprow = row
-            temprow[col_num] = outdate
-            out_table.append(temprow)
-        except ValueError:
-            print('line', i+1, 'contains a date', row[col_num], 'not consistant with format', in_fmt, ', ignoring row')
-            out_table.append(row)
-    
-    infile.close()
-
-    outfile = open(filename, 'w')
-    outcsv = csv.writer(outfile, delimiter=',', quotechar='"')
-    outcsv.writerows(out_table)
-    outfile.close()
+import os
+import glob
+import shutil
+import tempfile
+import itertools
+import concurrent.futures
+import pandas as pd
 
-def sum_col(filename, field_str):
-    infile = open(filename, 'r')
-    incsv = csv.reader(infile, delimiter=',', quotechar='"')
-    inheader = incsv.__next__()
+import dateParser
+
+# Takes in a filename to a csv file and converts every value in the columns in cols from date
+# format in_fmt to the format defined in out_fmt. cols can be a column number, a column name,
+# or a list of them. The file is streamed a row at a time into a temporary file next to it that
+# then replaces the original, so a crash partway through leaves the original untouched. Dates
+# are parsed with dateParser.parse_date_str, whose cache is bounded, so memory stays the same
+# however many distinct dates the file has. Up to max_errors bad dates get printed at the end, and
+# the number of bad dates is returned. Rows with a bad date are kept with the value unchanged
+def fix_date_format(filename, cols, in_fmt, out_fmt, max_errors=10):
+    if not isinstance(cols, list):
+        cols = [cols]
+
+    num_errors = 0
+    errors = []
+
+    out_dir = os.path.dirname(os.path.abspath(filename))
+    outfile = tempfile.NamedTemporaryFile('w', dir=out_dir, prefix='.' + os.path.basename(filename) + '.', suffix='.tmp', 
+                                          newline='', delete=False)
+    try:
+        with open(filename, 'r', newline='') as infile:
+            incsv = csv.reader(infile, delimiter=',', quotechar='"')
+            outcsv = csv.writer(outfile, delimiter=',', quotechar='"')
+
+            inheader = incsv.__next__() 
+            outcsv.writerow(inheader)
+
+            col_nums = [inheader.index(col) if isinstance(col, str) else col for col in cols]
+
+            for i, row in enumerate(incsv):
+                for col_num in col_nums:
+                    value = row[col_num]
+                    try:
+                        row[col_num] = dateParser.parse_date_str(value, in_fmt).strftime(out_fmt)
+                    except ValueError:
+                        num_errors += 1
+                        if len(errors) < max_errors:
+                            errors.append([i + 1, col_num, value])
+
+                outcsv.writerow(row)
+
+        outfile.close()
+        shutil.copymode(filename, outfile.name)
+        os.replace(outfile.name, filename)
+    except:
+        outfile.close()
+        os.remove(outfile.name)
+        raise
+
+    if num_errors:
+        print(num_errors, 'dates not consistant with format', in_fmt, 'were left unchanged, the first', len(errors), 'were:')
+        for line, col_num, value in errors:
+            print('\tline', line, 'column', col_num, ':', value)
+
+    return num_errors
+
+# The aggregate functions aggregate_cols can compute
+AGGREGATE_FUNCS = ['sum', 'count', 'min', 'max', 'mean']
+
+# Number of rows aggregate_cols reads at a time
+AGGREGATE_CHUNKSIZE = 100000
+
+# Takes in a path, glob pattern, or list of paths to csv files, and computes aggregates of their
+# columns in a single pass that reads each file a chunk at a time. aggregations maps each column
+# to one or a list of 'sum', 'count', 'min', 'max' and 'mean'. Values that are not numbers are
+# left out. If period is set ('D', 'M', 'Q' or 'Y') the rows are grouped by the period of their
+# date in date_col, read with the strptime format date_fmt if given. Rows whose date can not be
+# read are dropped, so they are not in any period. With more than one worker the files are read
+# in a process pool. Returns {col: {func: value}}, or with a period {period: {col: {func: value}}}
+# sorted by period
+def aggregate_cols(files, aggregations, date_col=None, period=None, date_fmt=None, workers=1, chunksize=AGGREGATE_CHUNKSIZE):
+    if isinstance(files, str):
+        files = sorted(glob.glob(files)) if glob.has_magic(files) else [files]
+
+    aggregations = {col: funcs if isinstance(funcs, list) else [funcs] for col, funcs in aggregations.items()}
+    for funcs in aggregations.values():
+        for func in funcs:
+            if func not in AGGREGATE_FUNCS:
+                raise ValueError('Unknown aggregate function ' + func)
 
-    col_i = inheader.index(field_str)
-    sum = 0.0
+    cols = list(aggregations.keys())
+    group_col = date_col if period is not None else None
 
-    for row in incsv:
-        sum += float(row[col_i])
-    
-    return sum
+    if workers > 1 and len(files) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(aggregate_file, files, itertools.repeat(cols), itertools.repeat(group_col), 
+                                         itertools.repeat(period), itertools.repeat(date_fmt), itertools.repeat(chunksize)))
+    else:
+        partials = [aggregate_file(file, cols, group_col, period, date_fmt, chunksize) for file in files]
+
+    # Add the partial results of the files together, [sum, count, min, max] for each column
+    totals = {}
+    for partial in partials:
+        merge_partials(totals, partial)
+
+    results = {}
+    for key in sorted(totals):
+        results[key] = {}
+        for col, funcs in aggregations.items():
+            col_sum, col_count, col_min, col_max = totals[key].get(col, [0.0, 0, float('nan'), float('nan')])
+            values = {
+                'sum': col_sum,
+                'count': col_count,
+                'min': col_min,
+                'max': col_max,
+                'mean': col_sum / col_count if col_count else float('nan'),
+            }
+            results[key][col] = {func: values[func] for func in funcs}
+
+    if period is None:
+        return results.get('', {col: aggregate_empty(funcs) for col, funcs in aggregations.items()})
+
+    return results
+
+# The results of aggregate_cols for a column without any values
+def aggregate_empty(funcs):
+    values = {'sum': 0.0, 'count': 0, 'min': float('nan'), 'max': float('nan'), 'mean': float('nan')}
+    return {func: values[func] for func in funcs}
+
+# Reads one csv file a chunk at a time and returns {period: {col: [sum, count, min, max]}}, with
+# '' for the period if group_col is None. Rows with a date in group_col that can not be read are
+# skipped
+def aggregate_file(filename, cols, group_col, period, date_fmt, chunksize):
+    usecols = list(dict.fromkeys(cols + ([group_col] if group_col is not None else [])))
+
+    totals = {}
+    with open(filename, 'r', newline='') as infile:
+        for chunk in pd.read_csv(infile, usecols=usecols, dtype=str, chunksize=chunksize):
+            values = pd.DataFrame({col: pd.to_numeric(chunk[col], errors='coerce') for col in cols})
+
+            if group_col is None:
+                keys = pd.Series('', index=chunk.index)
+            else:
+                dates = pd.to_datetime(chunk[group_col], format=date_fmt if date_fmt is not None else 'mixed', errors='coerce')
+                has_date = dates.notna()
+                values = values[has_date]
+                keys = dates[has_date].dt.to_period(period).astype(str)
+
+            grouped = values.groupby(keys.to_numpy(), sort=False).agg(['sum', 'count', 'min', 'max'])
+
+            chunk_totals = {}
+            for key, row in grouped.iterrows():
+                chunk_totals[key] = {col: [float(row[(col, 'sum')]), int(row[(col, 'count')]), float(row[(col, 'min')]), float(row[(col, 'max')])] 
+                                     for col in cols}
+            merge_partials(totals, chunk_totals)
+
+    return totals
+
+# Adds partial results from aggregate_file into totals
+def merge_partials(totals, partial):
+    for key, cols in partial.items():
+        key_totals = totals.setdefault(key, {})
+        for col, (col_sum, col_count, col_min, col_max) in cols.items():
+            if col_count == 0:
+                continue
+
+            if col not in key_totals:
+                key_totals[col] = [col_sum, col_count, col_min, col_max]
+            else:
+                col_totals = key_totals[col]
+                col_totals[0] += col_sum
+                col_totals[1] += col_count
+                col_totals[2] = min(col_totals[2], col_min)
+                col_totals[3] = max(col_totals[3], col_max)
+
+# Takes in a filename to a csv file and adds up the values in the column named field_str, see
+# aggregate_cols
+def sum_col(filename, field_str):
+    return aggregate_cols(filename, {field_str: 'sum'})[field_str]['sum']
 
 if __name__ == '__main__':
     print(sum_col('mercari_reports/2022report.csv', 'Net Seller Proceeds')) 
@@ -0,0 +1,117 @@
+import datetime
+import functools
+
+# The most date strings parse_date remembers. A few years of reports only have a few thousand
+# distinct days in them
+DATE_CACHE_SIZE = 65536
+
+# The context of the current run, see get_run_context
+run_context = None
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Class name:       RunContext                                                              *
+*                                                                                           *
+* Description:      Holds what stays the same for a whole run of the scripts. The date      *
+*                   'present' and the report date ranges resolve to is looked up once here, *
+*                   so a run that goes past midnight stays consistent                       *
+*                                                                                           *
+* Parameters:      datetime date today  : The date to run as, defaults to the current date  *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+class RunContext:
+    def __init__(self, today=None):
+        if today is None:
+            today = datetime.date.today()
+
+        self.today = today
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    get_run_context                                                         *
+*                                                                                           *
+* Description:      Returns the context of the current run, creating one for the current    *
+*                   date the first time if set_run_context was not called                   *
+*                                                                                           *
+* Return Value:     RunContext                                                              *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def get_run_context():
+    global run_context
+
+    if run_context is None:
+        run_context = RunContext()
+
+    return run_context
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    set_run_context                                                         *
+*                                                                                           *
+* Description:      Sets the context of the current run, for example to run as of another   *
+*                   date                                                                    *
+*                                                                                           *
+* Parameters:       RunContext context  :   The new context, None to create a new one for   *
+*                                           the current date on the next get_run_context    *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def set_run_context(context):
+    global run_context
+    run_context = context
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    parse_date                                                              *
+*                                                                                           *
+* Description:      Converts a string to a date. 'present' gives the date of the run        *
+*                   context, and the results for other strings are remembered so each one   *
+*                   is only parsed once                                                     *
+*                                                                                           *
+* Parameters:       str date_str    :   The date to parse                                   *
+*                   str fmt         :   The strptime format of the date, defaults to        *
+*                                       YYYY-MM-DD                                          *
+*                                                                                           *
+* Return Value:     datetime date                                                           *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def parse_date(date_str, fmt='%Y-%m-%d'):
+    if date_str == 'present':
+        return get_run_context().today
+
+    return parse_date_str(date_str, fmt)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    parse_date_str                                                          *
+*                                                                                           *
+* Description:      The cached part of parse_date. Dates in the format YYYY-MM-DD are split  *
+*                   up by hand, which is a lot faster than strptime                         *
+*                                                                                           *
+* Parameters:       str date_str    :   The date to parse                                   *
+*                   str fmt         :   The strptime format of the date                     *
+*                                                                                           *
+* Return Value:     datetime date                                                           *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date_str(date_str, fmt):
+    if (fmt == '%Y-%m-%d' and len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-' and
+            date_str[:4].isdigit() and date_str[5:7].isdigit() and date_str[8:].isdigit()):
+        try:
+            return datetime.date(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:]))
+        except ValueError:
+            pass # Let strptime raise its error for an invalid date like 2023-02-30
+
+    return datetime.datetime.strptime(date_str, fmt).date()
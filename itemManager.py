@@ -2,6 +2,17 @@ import csv
 import os
 from os import system, name
 import datetime 
+import bisect
+import heapq
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Scripts I have made
+import dateParser
+
+# The formats dates can be typed in by input_date, they are stored in the tables as YYYY-MM-DD
+DATE_INPUT_FORMATS = ['%Y-%m-%d', '%m-%d-%Y']
 
 def clear():
  
@@ -13,6 +24,34 @@ def clear():
     else:
         _ = system('clear')
 
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    input_date                                                              *
+*                                                                                           *
+* Description:      Asks for a date until one is entered that can be read, so that a typo   *
+*                   does not end up in the lookup table                                     *
+*                                                                                           *
+* Parameters:       str prompt  :   What to ask                                             *
+*                                                                                           *
+* Return Value:     str         :   The date as YYYY-MM-DD, or 'present'                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def input_date(prompt):
+    while True:
+        date_str = input(prompt).strip()
+        if date_str == 'present':
+            return date_str
+
+        for fmt in DATE_INPUT_FORMATS:
+            try:
+                return dateParser.parse_date(date_str, fmt).strftime('%Y-%m-%d')
+            except ValueError:
+                pass
+
+        print('Could not read the date "' + date_str + '", enter it as YYYY-MM-DD or MM-DD-YYYY')
+
 '''
 * ***************************************************************************************** *
 *                                                                                           *
@@ -27,12 +66,15 @@ def clear():
 *                  str   csv_dir              : The directory to put the csv into           *
 *                  str   lookup_table_filename: name for the item cost csv file             *
 *                  str   alias_table_filename : name for the alias csv file                 *
+*                  RunContext run_context     : The date "present" resolves to, defaults to *
+*                                               dateParser.get_run_context                  *
 *                                                                                           *
 * ***************************************************************************************** *
 '''
 class ItemManager:
-    def __init__(self, header, csv_dir='./', lookup_table_filename='item_lookup_table.csv', alias_table_filename='item_alias_table.csv'):
+    def __init__(self, header, csv_dir='./', lookup_table_filename='item_lookup_table.csv', alias_table_filename='item_alias_table.csv', run_context=None):
         self.csv_dir = csv_dir
+        self.run_context = run_context if run_context is not None else dateParser.get_run_context()
         self.lookup_table_filename = lookup_table_filename
         self.alias_table_filename = alias_table_filename
 
@@ -57,14 +99,37 @@ class ItemManager:
         self.lookup_table_enddate_i = self.lookup_table_header.index('End Date')
         self.lookup_table = []
 
-        self.load_tables()
-        
+        # Index built from the tables so that get_cost does not have to scan them on every call.
+        # alias_index maps an item name to the item it points to, and cost_index maps an item to
+        # its date ranges sorted by start date. It gets rebuilt by update_cost_index when the
+        # tables change
+        self.alias_index = {}
+        self.cost_index = {}
+        self.cost_index_ignore_pos = None
+        self.cost_index_date = None
+        self.cost_index_signature = None
+
+        # Positions of the lookup table rows left out of the cost index because their dates can
+        # not be read, see find_range_problems
+        self.unreadable_rows = []
+
         # Valid items are the items within the lookup table either with a price, or which are to be ignored
-        self.valid_items = []
+        self.valid_items = set()
 
         # New items are items yet to be added to the lookup table. This allows the define costs function
         # to see which items need costs added to them
-        self.new_items = []
+        self.new_items = set()
+
+        # Both sets are kept up to date as rows, aliases and costs are added. Set this flag after
+        # editing the tables directly so the sets get rebuilt by update_valid_items
+        self.valid_items_dirty = True
+
+        # Copies of the tables as they were last loaded from or written to the csv files, so that
+        # changes made since then can be found by get_affected_months
+        self.saved_lookup_table = []
+        self.saved_alias_table = []
+
+        self.load_tables()
 
     '''
     * ***************************************************************************************** *
@@ -82,8 +147,11 @@ class ItemManager:
             infile = open(self.csv_dir + self.lookup_table_filename, 'r')
             incsv = csv.reader(infile, delimiter=',', quotechar='"')
 
-            self.lookup_table_header = incsv.__next__()
-            self.lookup_table = [row for row in incsv]
+            # An empty file, such as the one created below, has no header yet
+            header = next(incsv, None)
+            if header is not None:
+                self.lookup_table_header = header
+                self.lookup_table = [row for row in incsv]
             infile.close()
 
         else:
@@ -107,8 +175,11 @@ class ItemManager:
             infile = open(self.csv_dir + self.alias_table_filename, 'r')
             incsv = csv.reader(infile, delimiter=',', quotechar='"')
 
-            self.alias_table_header= incsv.__next__()
-            self.alias_table = [row for row in incsv]
+            # An empty file, such as the one created below, has no header yet
+            header = next(incsv, None)
+            if header is not None:
+                self.alias_table_header = header
+                self.alias_table = [row for row in incsv]
             infile.close()
         else:
             outfile = open(self.csv_dir + self.alias_table_filename, 'w')
@@ -129,6 +200,12 @@ class ItemManager:
     def load_tables(self):
         self.load_lookuptable()
         self.load_alias_table()
+        self.cost_index_signature = None
+        self.valid_items_dirty = True
+        self.save_tables_snapshot()
+
+        # Building the index checks the date ranges, so any problems are shown as soon as the tables load
+        self.print_range_problems()
     
     '''
     * ***************************************************************************************** *
@@ -182,6 +259,23 @@ class ItemManager:
     def write_tables(self):
         self.write_lookup_table()
         self.write_alias_table()
+        self.save_tables_snapshot()
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    save_tables_snapshot                                                    *
+    *                                                                                           *
+    * Description:      Copies the tables into self.saved_lookup_table and                      *
+    *                   self.saved_alias_table, marking them as matching the csv files          *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def save_tables_snapshot(self):
+        self.saved_lookup_table = [list(row) for row in self.lookup_table]
+        self.saved_alias_table = [list(row) for row in self.alias_table]
     
     '''
     * ***************************************************************************************** *
@@ -213,11 +307,10 @@ class ItemManager:
     * ***************************************************************************************** *
     '''
     def tables_complete(self):
-        for item_name in self.items:
-            if not any(row[self.lookup_table_item_i] == item_name for row in self.lookup_table) and not self.get_alias(item_name):
-                return False
-        
-        return True
+        if self.valid_items_dirty:
+            self.update_valid_items()
+
+        return not self.new_items
     
     '''
     * ***************************************************************************************** *
@@ -231,7 +324,43 @@ class ItemManager:
     * ***************************************************************************************** *
     '''
     def create_alias(self, item_name, alias):
+        self.update_cost_index()
         self.alias_table.append([item_name, alias])  
+
+        # Add the row to the index rather than rebuilding it
+        self.alias_index.setdefault(item_name, alias)
+        self.cost_index_signature = self.get_tables_signature(self.cost_index_date)
+
+        if item_name in self.items and self.get_alias(item_name) != '':
+            self.valid_items.add(item_name)
+            self.new_items.discard(item_name)
+    
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    add_lookup_row                                                          *
+    *                                                                                           *
+    * Description:      Adds an entry to the lookup table                                       *
+    *                                                                                           *
+    * Parameters:       str item        :   The name of the item                                *
+    *                   str cost        :   How much the item costs, -1 to ignore the item      *
+    *                   str start_date  :   The first date(exclusive) the cost applies to       *
+    *                   str end_date    :   The last date(inclusive) the cost applies to        *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def add_lookup_row(self, item, cost, start_date, end_date):
+        self.update_cost_index()
+        self.lookup_table.append([item, cost, start_date, end_date])
+        
+        # Add the row to the index rather than rebuilding it
+        self.index_lookup_row(len(self.lookup_table) - 1, self.lookup_table[-1])
+        self.cost_index_signature = self.get_tables_signature(self.cost_index_date)
+
+        self.valid_items.add(item)
+        self.new_items.discard(item)
     
     '''
     * ***************************************************************************************** *
@@ -248,11 +377,9 @@ class ItemManager:
     * ***************************************************************************************** *
     '''
     def get_alias(self, item_name):
-        for row in self.alias_table:
-            if (row[self.alias_table_item_i] == item_name):
-                return row[self.alias_table_alias_i]
+        self.update_cost_index()
 
-        return ''
+        return self.alias_index.get(item_name, '')
     
     '''
     * ***************************************************************************************** *
@@ -263,46 +390,557 @@ class ItemManager:
     *                   the price for                                                           *
     *                                                                                           *
     * Parameters:       str item      :     The item for which to find the cost for             *
-    *                   datetime date :     The date for which to find the cost for             * 
+    *                   datetime date :     The date for which to find the cost for, either a   * 
+    *                                       date or a string in the format YYYY-MM-DD           *
     *                                                                                           *
     * Return Value:     float         :     The cost of the item                                *
     *                                                                                           *
     * ***************************************************************************************** *
     '''
     def get_cost(self, item, date):
-        alias = self.get_alias(item)
+        self.update_cost_index()
+
+        if self.valid_items_dirty:
+            self.update_valid_items()
+
+        alias = self.alias_index.get(item, '')
             
         if alias:
             item = alias
 
         if date == 'present':
-            date = datetime.datetime.now().date()
-        else:
-            date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+            date = self.run_context.today
+        elif isinstance(date, datetime.datetime):
+            date = date.date()
+        elif not isinstance(date, datetime.date):
+            date = dateParser.parse_date(date)
 
         if item in self.valid_items:
-            for row in self.lookup_table:
-                
-                if row[self.lookup_table_cost_i] == -1:
-                    return 'ignore' 
+            match_pos = self.find_cost_row(item, date)
+            
+            if self.cost_index_ignore_pos is not None and (match_pos is None or self.cost_index_ignore_pos < match_pos):
+                return 'ignore'
 
-                start_str = row[self.lookup_table_startdate_i].strip()
-                end_str = row[self.lookup_table_enddate_i].strip()
+            if match_pos is not None:
+                return self.lookup_table[match_pos][self.lookup_table_cost_i]
+        
+        return -1
 
-                if start_str == 'present':
-                    start_date = datetime.datetime.today().date()
-                else:
-                    start_date = datetime.datetime.strptime(row[self.lookup_table_startdate_i].strip(), '%Y-%m-%d').date()
-                
-                if end_str == 'present':
-                    end_date = datetime.datetime.today().date()
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_costs                                                               *
+    *                                                                                           *
+    * Description:      Obtains the costs of many items at once. The dates are matched to the   *
+    *                   date ranges in the cost index with an as-of merge, giving the same      *
+    *                   costs as get_cost                                                       *
+    *                                                                                           *
+    * Parameters:       [str] items         :   The items to find the costs for, a list, array  *
+    *                                           or pandas series                                *
+    *                   [datetime] dates    :   The date to find the cost for for each item,    *
+    *                                           datetimes or strings in the format YYYY-MM-DD   *
+    *                                                                                           *
+    * Return Value:     (numpy array, numpy array)  :   The cost of each item as a float, and a *
+    *                                                   mask that is True where the item is     *
+    *                                                   ignored or has no cost on its date. The *
+    *                                                   cost is NaN there                       *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_costs(self, items, dates):
+        self.update_cost_index()
+
+        titles = pd.Series(items, dtype=object).reset_index(drop=True).fillna('')
+        dates = pd.to_datetime(pd.Series(dates).reset_index(drop=True), format='mixed').dt.normalize().astype('datetime64[ns]')
+
+        aliases = titles.map(self.alias_index).fillna('')
+        resolved = titles.where(aliases == '', aliases)
+
+        # One row per date range in the cost index, where the ranges of an item never overlap
+        range_items, range_starts, range_ends, range_pos = [], [], [], []
+
+        for item, index in self.cost_index.items():
+            for start_date, end_date, pos in index[1]:
+                range_items.append(item)
+                range_starts.append(start_date)
+                range_ends.append(end_date)
+                range_pos.append(pos)
+        
+        lookup = pd.DataFrame({
+            'Resolved item': pd.Series(range_items, dtype=object),
+            'Start': pd.to_datetime(pd.Series(range_starts, dtype=object)).astype('datetime64[ns]'),
+            'End': pd.to_datetime(pd.Series(range_ends, dtype=object)).astype('datetime64[ns]'),
+            'Row': pd.Series(range_pos, dtype=float),
+        }).sort_values('Start', kind='stable')
+
+        left = pd.DataFrame({
+            'Resolved item': resolved.astype(object),
+            'Date': dates,
+            'Order i': np.arange(len(dates)),
+        }).sort_values('Date', kind='stable')
+
+        # The start date of a range is exclusive, so exact matches are not allowed
+        merged = pd.merge_asof(left, lookup, left_on='Date', right_on='Start', by='Resolved item',
+                               allow_exact_matches=False, direction='backward')
+        merged = merged.sort_values('Order i')
+
+        match_pos = merged['Row'].where(merged['End'] >= merged['Date']).to_numpy()
+
+        # A row with a cost of -1 marks every lookup past it as ignored
+        if self.cost_index_ignore_pos is not None:
+            match_pos[match_pos >= self.cost_index_ignore_pos] = np.nan
+        
+        # The cost for each row of the lookup table, NaN if the row is an ignored item. The extra 
+        # NaN at the end is where items without a row point to
+        row_costs = []
+        for row in self.lookup_table:
+            cost = row[self.lookup_table_cost_i]
+            try:
+                row_costs.append(np.nan if cost == '-1' or cost == -1 else float(cost))
+            except ValueError:
+                row_costs.append(np.nan)
+        row_costs.append(np.nan)
+
+        match_pos = np.where(np.isnan(match_pos), -1, match_pos).astype(int)
+        costs = np.array(row_costs)[match_pos]
+
+        return costs, np.isnan(costs)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    find_cost_row                                                           *
+    *                                                                                           *
+    * Description:      Finds the row of the lookup table with the cost of an item on a date.   *
+    *                   The cost index must be up to date, see update_cost_index                *
+    *                                                                                           *
+    * Parameters:       str item      :     The item name, after looking up its alias           *
+    *                   datetime date :     The date for which to find the cost for             *
+    *                                                                                           *
+    * Return Value:     int           :     Position of the row, None if there is not one       *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def find_cost_row(self, item, date):
+        if item not in self.cost_index:
+            return None
+
+        match_pos = None
+        starts, ranges = self.cost_index[item][0], self.cost_index[item][1]
+        
+        # Only the ranges starting before the date can contain it
+        candidates = bisect.bisect_left(starts, date)
+
+        # The ranges never overlap in the index, so only the last one starting before the date can hold it
+        if candidates and date <= ranges[candidates - 1][1]:
+            match_pos = ranges[candidates - 1][2]
+
+        return match_pos
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    build_cost_index                                                        *
+    *                                                                                           *
+    * Description:      Builds the alias and cost indexes used by get_cost. Every date in the   *
+    *                   lookup table is parsed once here, and the date ranges for each item are *
+    *                   sorted by start date so they can be searched with bisect. Rows with a   *
+    *                   date that can not be read are left out                                  *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def build_cost_index(self):
+        self.cost_index_date = self.run_context.today
+
+        # The first row for an item in the alias table is the one that gets used
+        self.alias_index = {}
+        for row in self.alias_table:
+            self.alias_index.setdefault(row[self.alias_table_item_i], row[self.alias_table_alias_i])
+
+        self.cost_index = {}
+        self.cost_index_ignore_pos = None
+        self.unreadable_rows = []
+
+        # Collect the date ranges of each item, then sort and index them once per item
+        item_ranges = {}
+        for pos, row in enumerate(self.lookup_table):
+            # A row with a cost of -1 marks every lookup past it as ignored
+            if row[self.lookup_table_cost_i] == -1:
+                if self.cost_index_ignore_pos is None:
+                    self.cost_index_ignore_pos = pos
+                continue
+
+            try:
+                start_date, end_date = self.get_row_range(row, self.cost_index_date)
+            except ValueError:
+                self.unreadable_rows.append(pos)
+                continue
+
+            item_ranges.setdefault(row[self.lookup_table_item_i], []).append((start_date, end_date, pos))
+
+        for item, ranges in item_ranges.items():
+            ranges.sort()
+            self.index_item_ranges(item, ranges)
+
+        self.cost_index_signature = self.get_tables_signature(self.cost_index_date)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    index_lookup_row                                                        *
+    *                                                                                           *
+    * Description:      Parses the dates of a lookup table row and inserts its date range into  *
+    *                   the cost index, then indexes the item's ranges again. A row with a date *
+    *                   that can not be read is left out                                        *
+    *                                                                                           *
+    * Parameters:       int   pos   :   The position of the row in the lookup table             *
+    *                   [str] row   :   A row of the lookup table                               *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def index_lookup_row(self, pos, row):
+        # A row with a cost of -1 marks every lookup past it as ignored
+        if row[self.lookup_table_cost_i] == -1:
+            if self.cost_index_ignore_pos is None:
+                self.cost_index_ignore_pos = pos
+            return
+
+        try:
+            start_date, end_date = self.get_row_range(row, self.cost_index_date)
+        except ValueError:
+            self.unreadable_rows.append(pos)
+            return
+
+        item = row[self.lookup_table_item_i]
+        ranges = list(self.cost_index[item][3]) if item in self.cost_index else []
+        bisect.insort(ranges, (start_date, end_date, pos))
+
+        self.index_item_ranges(item, ranges)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    index_item_ranges                                                       *
+    *                                                                                           *
+    * Description:      Puts the date ranges of an item into the cost index. Overlapping ranges *
+    *                   are split up so that every date belongs to at most one range, with the  *
+    *                   row that comes first in the lookup table winning, which lets            *
+    *                   find_cost_row use a binary search for every item. The index entry for   *
+    *                   an item is [start dates, ranges, overlapping, rows from the table]      *
+    *                                                                                           *
+    * Parameters:       str item                        :   The item name                       *
+    *                   [(date, date, int)] ranges      :   The start date, end date and        *
+    *                                                       position of each of the item's rows *
+    *                                                       sorted by start date                *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def index_item_ranges(self, item, ranges):
+        # Ranges include their end date but not their start date, so they only overlap if a 
+        # range ends after the next one starts
+        overlapping = any(ranges[i][1] > ranges[i + 1][0] for i in range(len(ranges) - 1))
+
+        if not overlapping:
+            segments = ranges
+        else:
+            # Between two neighboring dates from the ranges, every date is in the same rows
+            bounds = sorted(set([start_date for start_date, _, _ in ranges] + [end_date for _, end_date, _ in ranges]))
+
+            # Sweep over the bounds keeping the ranges that have started in a heap ordered by their
+            # position in the table. Ranges that have ended are only dropped once they reach the top
+            active = []
+            next_range = 0
+
+            segments = []
+            for seg_start, seg_end in zip(bounds, bounds[1:]):
+                while next_range < len(ranges) and ranges[next_range][0] <= seg_start:
+                    heapq.heappush(active, (ranges[next_range][2], ranges[next_range][1]))
+                    next_range += 1
+
+                while active and active[0][1] < seg_end:
+                    heapq.heappop(active)
+
+                if not active:
+                    continue
+
+                pos = active[0][0]
+                if segments and segments[-1][1] == seg_start and segments[-1][2] == pos:
+                    segments[-1] = (segments[-1][0], seg_end, pos)
                 else:
-                    end_date = datetime.datetime.strptime(row[self.lookup_table_enddate_i].strip(), '%Y-%m-%d').date()
+                    segments.append((seg_start, seg_end, pos))
+
+        self.cost_index[item] = [[start_date for start_date, _, _ in segments], segments, overlapping, ranges]
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    find_range_problems                                                     *
+    *                                                                                           *
+    * Description:      Checks the date ranges of every item in the lookup table for overlaps,  *
+    *                   gaps between them, ranges that end before they start, and rows with     *
+    *                   dates that can not be read                                              *
+    *                                                                                           *
+    * Return Value:     [[str, str, date, date]]    :   The item, the problem ('overlap',       *
+    *                                                   'gap', 'backwards' or 'unreadable') and *
+    *                                                   the dates it covers, sorted by item.    *
+    *                                                   For 'unreadable' the dates are the      *
+    *                                                   strings from the table                  *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def find_range_problems(self):
+        self.update_cost_index()
+
+        problems = []
+        for item in sorted(self.cost_index):
+            ranges = self.cost_index[item][3]
+
+            covered_end = None
+            for start_date, end_date, pos in ranges:
+                if end_date < start_date:
+                    problems.append([item, 'backwards', start_date, end_date])
+                    continue
+
+                if covered_end is not None:
+                    if covered_end > start_date:
+                        problems.append([item, 'overlap', start_date, min(covered_end, end_date)])
+                    elif covered_end < start_date:
+                        problems.append([item, 'gap', covered_end, start_date])
+
+                covered_end = end_date if covered_end is None else max(covered_end, end_date)
+
+        for pos in self.unreadable_rows:
+            row = self.lookup_table[pos]
+            problems.append([row[self.lookup_table_item_i], 'unreadable', row[self.lookup_table_startdate_i], 
+                             row[self.lookup_table_enddate_i]])
+
+        problems.sort(key=lambda problem: problem[0])
+        return problems
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    print_range_problems                                                    *
+    *                                                                                           *
+    * Description:      Prints every problem found by find_range_problems                       *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def print_range_problems(self):
+        problems = self.find_range_problems()
+        if not problems:
+            return
+
+        print('Problems with the date ranges in the lookup table:')
+        for item, problem, start_date, end_date in problems:
+            print('\t', item, '-', problem, 'from', start_date, 'to', end_date)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_row_range                                                           *
+    *                                                                                           *
+    * Description:      Parses the start and end dates of a lookup table row. Raises ValueError *
+    *                   if either date can not be read                                          *
+    *                                                                                           *
+    * Parameters:       [str] row           :   A row of the lookup table                       *
+    *                   datetime date today :   The date "present" resolves to                  *
+    *                                                                                           *
+    * Return Value:     (datetime date, datetime date)                                          *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_row_range(self, row, today):
+        dates = []
+        for date_str in [row[self.lookup_table_startdate_i].strip(), row[self.lookup_table_enddate_i].strip()]:
+            if date_str == 'present':
+                dates.append(today)
+            else:
+                dates.append(dateParser.parse_date(date_str))
+
+        return dates[0], dates[1]
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_changed_ranges                                                      *
+    *                                                                                           *
+    * Description:      Compares an older version of the tables to the current ones, and finds  *
+    *                   the date ranges where the cost of each item may have changed. Rows that *
+    *                   were added or removed are what changed for an item, unless its ranges   *
+    *                   overlap, then the order of the rows matters and every range of the item *
+    *                   counts. An item whose alias changed gets the ranges of both the old and *
+    *                   new item it points to                                                   *
+    *                                                                                           *
+    * Parameters:       [[str]] old_lookup_table    :   The older lookup table, defaults to the *
+    *                                                   one last loaded or written              *
+    *                   [[str]] old_alias_table     :   The older alias table, defaults to the  *
+    *                                                   one last loaded or written              *
+    *                                                                                           *
+    * Return Value:     {str: [(datetime date, datetime date)]}  :   The ranges for each        *
+    *                                                                changed item               *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_changed_ranges(self, old_lookup_table=None, old_alias_table=None):
+        if old_lookup_table is None:
+            old_lookup_table = self.saved_lookup_table
+        if old_alias_table is None:
+            old_alias_table = self.saved_alias_table
+
+        today = self.run_context.today
+
+        def get_item_rows(lookup_table):
+            item_rows = {}
+            for row in lookup_table:
+                item_rows.setdefault(row[self.lookup_table_item_i], []).append([str(value).strip() for value in row])
+            return item_rows
+
+        # The first row for an item in the alias table is the one that gets used
+        def get_aliases(alias_table):
+            aliases = {}
+            for row in alias_table:
+                aliases.setdefault(row[self.alias_table_item_i], row[self.alias_table_alias_i])
+            return aliases
 
-                if (row[self.lookup_table_item_i] == item) and (date > start_date) and (date <= end_date):
-                    return row[self.lookup_table_cost_i]
+        # Rows with dates that can not be read are not in the cost index, so they never change a cost
+        def get_ranges(rows):
+            ranges = []
+            for row in rows:
+                try:
+                    ranges.append(self.get_row_range(row, today))
+                except ValueError:
+                    pass
+            return ranges
+
+        def ranges_overlap(ranges):
+            ranges = sorted(ranges)
+            return any(ranges[i][1] > ranges[i + 1][0] for i in range(len(ranges) - 1))
+
+        old_rows = get_item_rows(old_lookup_table)
+        new_rows = get_item_rows(self.lookup_table)
+
+        changed_ranges = {}
+        for item in set(old_rows) | set(new_rows):
+            old_item_rows = old_rows.get(item, [])
+            new_item_rows = new_rows.get(item, [])
+            if old_item_rows == new_item_rows:
+                continue
+
+            old_ranges = get_ranges(old_item_rows)
+            new_ranges = get_ranges(new_item_rows)
+
+            if ranges_overlap(old_ranges) or ranges_overlap(new_ranges):
+                changed_ranges[item] = old_ranges + new_ranges
+            else:
+                changed_ranges[item] = (get_ranges([row for row in old_item_rows if row not in new_item_rows]) + 
+                                        get_ranges([row for row in new_item_rows if row not in old_item_rows]))
+
+        old_aliases = get_aliases(old_alias_table)
+        new_aliases = get_aliases(self.alias_table)
+
+        for item in set(old_aliases) | set(new_aliases):
+            old_alias = old_aliases.get(item, '') or item
+            new_alias = new_aliases.get(item, '') or item
+            if old_alias != new_alias:
+                changed_ranges.setdefault(item, []).extend(get_ranges(old_rows.get(old_alias, [])) + 
+                                                           get_ranges(new_rows.get(new_alias, [])))
         
-        return -1
+        return changed_ranges
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_affected_months                                                     *
+    *                                                                                           *
+    * Description:      Finds every month that has a date where the cost of an item may have    *
+    *                   changed since an older version of the tables, see get_changed_ranges.   *
+    *                   Reports for other months do not need to be computed again               *
+    *                                                                                           *
+    * Parameters:       [[str]] old_lookup_table    :   The older lookup table, defaults to the *
+    *                                                   one last loaded or written              *
+    *                   [[str]] old_alias_table     :   The older alias table, defaults to the  *
+    *                                                   one last loaded or written              *
+    *                                                                                           *
+    * Return Value:     {(int, int)}    :   The months as (year, month)                         *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_affected_months(self, old_lookup_table=None, old_alias_table=None):
+        months = set()
+        for ranges in self.get_changed_ranges(old_lookup_table, old_alias_table).values():
+            for start_date, end_date in ranges:
+                year, month = start_date.year, start_date.month
+                while (year, month) <= (end_date.year, end_date.month):
+                    months.add((year, month))
+                    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        return months
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_tables_signature                                                    *
+    *                                                                                           *
+    * Description:      Returns a value that changes whenever rows are added to or removed from *
+    *                   the tables, the tables are replaced, or the day changes                 *
+    *                                                                                           *
+    * Parameters:       datetime date today :   The date "present" resolves to                  *
+    *                                                                                           *
+    * Return Value:     tuple                                                                   *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_tables_signature(self, today):
+        return (id(self.lookup_table), len(self.lookup_table), id(self.alias_table), len(self.alias_table), today)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_tables_fingerprint                                                  *
+    *                                                                                           *
+    * Description:      Hashes the contents of the lookup and alias tables. Unlike              *
+    *                   get_tables_signature it stays the same between runs, so it can be saved *
+    *                   with anything computed from the costs                                   *
+    *                                                                                           *
+    * Return Value:     str     :   The hash as hex                                             *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_tables_fingerprint(self):
+        hasher = hashlib.sha256()
+        for table in [self.lookup_table, self.alias_table]:
+            for row in table:
+                hasher.update(('\x1f'.join(str(value) for value in row) + '\n').encode('utf-8'))
+            hasher.update(b'\x1e')
+
+        return hasher.hexdigest()
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    update_cost_index                                                       *
+    *                                                                                           *
+    * Description:      Rebuilds the cost index only if the tables have changed since it was    *
+    *                   last built. Set self.cost_index_signature to None after editing rows of *
+    *                   the tables in place to force a rebuild                                  *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def update_cost_index(self):
+        if self.cost_index_signature != self.get_tables_signature(self.run_context.today):
+            self.build_cost_index()
+            self.valid_items_dirty = True
 
     '''
     * ***************************************************************************************** *
@@ -318,9 +956,35 @@ class ItemManager:
     * ***************************************************************************************** *
     '''
     def visit_row(self, row):
-        self.items.add(row[self.item_name_i])
+        self.visit_item(row[self.item_name_i])
 
-        self.update_valid_items()
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    visit_item                                                              *
+    *                                                                                           *
+    * Description:      Memorizes an item name into this class                                  *
+    *                                                                                           *
+    * Parameters:       str item    :   The title of an item from the ebay database csv         *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def visit_item(self, item):
+        if item in self.items:
+            return
+
+        self.items.add(item)
+        alias = self.get_alias(item)
+        
+        # A dirty set gets rebuilt from self.items anyway
+        if not self.valid_items_dirty:
+            if alias != '':
+                self.valid_items.add(item)
+
+            if item not in self.valid_items:
+                self.new_items.add(item)
     
     '''
     * ***************************************************************************************** *
@@ -328,17 +992,20 @@ class ItemManager:
     * Function name:    update_valid_items                                                      *
     *                                                                                           *
     * Description:      Makes it so that any items not in the lookup table are listed in the    *
-    *                   new itemes list                                                         *
+    *                   new itemes set. Only needed after editing the tables directly           *
     *                                                                                           *
     * Return Value:     none                                                                    *
     *                                                                                           *
     * ***************************************************************************************** *
     '''
     def update_valid_items(self):
-        self.valid_items = [item for item in [row[self.lookup_table_item_i] for row in self.lookup_table]]
-        self.valid_items.extend([item for item in self.items if self.get_alias(item) != ''])
+        self.update_cost_index()
 
-        self.new_items = [item for item in self.items if item not in self.valid_items]
+        self.valid_items = set(row[self.lookup_table_item_i] for row in self.lookup_table)
+        self.valid_items.update(item for item in self.items if self.get_alias(item) != '')
+
+        self.new_items = self.items - self.valid_items
+        self.valid_items_dirty = False
     
     '''
     * ***************************************************************************************** *
@@ -399,23 +1066,23 @@ class ItemManager:
             action = input('>> ')
 
             if action == '2':
-                for item in self.new_items:
+                for item in sorted(self.new_items):
                     print('Current item: ', item)
                     print('Enter -1 to ignore the item cost, and exit to quit entering costs')
                     
                     cost = input('Cost >> ')
 
                     if cost == '-1':
-                        self.lookup_table.append([item, cost,'2000-1-1','present']) 
+                        self.add_lookup_row(item, cost,'2000-1-1','present') 
                         continue
                     elif cost == 'exit':
                         break
 
-                    print('Dates in format MM-DD-YYYY')
-                    start_date = input('Effective start date >> ')
-                    end_date = input('Effective end date (input "present" if this is the current cost) >> ')
+                    print('Dates in format YYYY-MM-DD or MM-DD-YYYY')
+                    start_date = input_date('Effective start date >> ')
+                    end_date = input_date('Effective end date (input "present" if this is the current cost) >> ')
 
-                    self.lookup_table.append([item, cost, start_date, end_date])
+                    self.add_lookup_row(item, cost, start_date, end_date)
                     clear() 
                 
                 self.write_tables()
@@ -425,14 +1092,16 @@ class ItemManager:
 
                 item_i = input('Item >> ')
 
-                if int(item_i) < len(self.valid_items):
+                lookup_table_items = [row[self.lookup_table_item_i] for row in self.lookup_table]
+
+                if int(item_i) < len(lookup_table_items):
                     cost = input('Cost >> ')
-                    print('Dates in format MM-DD-YYYY')
+                    print('Dates in format YYYY-MM-DD or MM-DD-YYYY')
 
-                    start_date = input('Effective start date >> ')
-                    end_date = input('Effective end date (input "present" if this is the current cost) >> ')
+                    start_date = input_date('Effective start date >> ')
+                    end_date = input_date('Effective end date (input "present" if this is the current cost) >> ')
 
-                    self.lookup_table.append([self.valid_items[int(item_i)], cost, start_date, end_date])
+                    self.add_lookup_row(lookup_table_items[int(item_i)], cost, start_date, end_date)
             elif action == '0':
                 break
 
@@ -453,6 +1122,7 @@ if __name__ == "__main__":
     itemManager.lookup_table_header = lookup_table_header
     itemManager.alias_table_header = alias_table_header
     itemManager.alias_table = alias_table
+    itemManager.valid_items_dirty = True
 
     itemManager.visit_row(['Item8'])
     itemManager.visit_row(['Item1'])
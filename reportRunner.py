@@ -1,14 +1,24 @@
 import csv
+import sys
+import json
+import hashlib
+import itertools
+import copy
+import concurrent.futures
 import pandas as pd
+import numpy as np
 import os
 import glob
 import datetime
 import calendar
 import operator
+import math
+from array import array
 
 # Scripts I have made
 import costs
 import itemManager
+import dateParser
 '''
 Purpose: 
     Reads in an ebay orders report, cleans up the file, then writes a file 
@@ -38,394 +48,2091 @@ def clean_ebay_report(filename, overwrite=False):
         for line in file_lines:
             file.write(line + '\n')
 '''
+# Transaction types in the ebay reports that are not orders and get left out of the database
+EXCLUDED_TYPES = ['Payout', 'Refund', 'Shipping label', 'Other fee']
+
+# Columns of the ebay reports that have to be read as text. Left to pandas, order numbers, ids and
+# zip codes can get turned into numbers. Any column missing from a report is skipped
+REPORT_DTYPES = {
+    'Type': str,
+    'Order number': str,
+    'Legacy order ID': str,
+    'Buyer username': str,
+    'Buyer name': str,
+    'Buyer City': str,
+    'Buyer State': str,
+    'Buyer zip': str,
+    'Buyer country': str,
+    'Item ID': str,
+    'Item title': str,
+}
+
+# Columns of the database the reports read, see attach_item_costs
+REPORT_COLUMNS = ['Transaction creation date', 'Item title', 'Item subtotal', 'Shipping and handling', 
+                  'Final Value Fee - fixed', 'Final Value Fee - variable', 'Buyer State', 'Buyer City']
+
+# ebay puts -- in cells without data, reading them as missing lets the money columns be floats
+REPORT_NA_VALUES = ['--']
+
+# Number of rows read at a time when streaming reports or the database
+STREAM_CHUNKSIZE = 100000
+
+# Stored in the reports directory, see load_report_manifest
+REPORT_MANIFEST_FILENAME = 'report_manifest.json'
+
+# Caches written with a different version are read from the csv again, see save_database_cache
+DATABASE_CACHE_VERSION = 2
+
+# Where StatsGen keeps the monthly reports of closed months, see StatsGen.set_report_store
+REPORT_STORE_FILENAME = 'report_store.json'
+
+# Stores saved with a different version are not used, change it when EbayReport.to_dict changes
+REPORT_STORE_VERSION = 2
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    parse_ebay_report                                                       *
+*                                                                                           *
+* Description:      Loads an ebay transaction report csv into a pandas data frame, drops the*
+*                   rows with an excluded type and parses the dates. Runs in the worker     *
+*                   processes of read_ebay_reports                                          *
+*                                                                                           *
+* Parameters:       str   report_file       :   Path of the ebay report to load             *
+*                   [str] excluded_types    :   Transaction types to leave out              *
+*                                                                                           *
+* Return Value:     pandas dataframe        :   The orders in the report                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def parse_ebay_report(report_file, excluded_types=EXCLUDED_TYPES):
+    # There are 11 metadata rows in ebay transaction reports as of 11/8/23
+    frame = pd.read_csv(report_file, skiprows=11, dtype=REPORT_DTYPES, na_values=REPORT_NA_VALUES)
+    frame = frame[~frame['Type'].isin(excluded_types)].reset_index(drop=True)
+    frame['Transaction creation date'] = pd.to_datetime(frame['Transaction creation date'], format='mixed')
+
+    return frame
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    read_ebay_reports                                                       *
+*                                                                                           *
+* Description:      Loads ebay transaction report csvs into a single pandas data frame,     *
+*                   then drops the rows with an excluded type and duplicate orders. With    *
+*                   more than one worker the reports get parsed in a process pool, the      *
+*                   result is the same as parsing them one after another                    *
+*                                                                                           *
+* Parameters:       [str] report_files      :   Paths of the ebay reports to load           *
+*                   [str] excluded_types    :   Transaction types to leave out              *
+*                   pandas dataframe df     :   Rows to put in front of the reports, these  *
+*                                               win over duplicates in the reports          *
+*                   int   workers           :   Number of processes to parse reports with   *
+*                                                                                           *
+* Return Value:     pandas dataframe        :   The orders from all of the reports          *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def read_ebay_reports(report_files, excluded_types=EXCLUDED_TYPES, df=None, workers=1):
+    if workers > 1 and len(report_files) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            # map keeps the reports in order, so duplicates resolve the same as in serial mode
+            frames = list(executor.map(parse_ebay_report, report_files, itertools.repeat(excluded_types)))
+    else:
+        frames = [parse_ebay_report(file, excluded_types) for file in report_files]
+
+    if df is not None:
+        frames.insert(0, df[~df['Type'].isin(excluded_types)])
+    
+    if not frames:
+        return pd.DataFrame()
+
+    # Merge everything at once rather than copying the data frame once per report, then remove
+    # any accidental duplicate entries based on the order numbers. Types were filtered first so
+    # that a refund cannot stand in for its order
+    merged = pd.concat(frames, ignore_index=True)
+    merged = merged.drop_duplicates(subset='Order number', keep='first')
+
+    return merged.reset_index(drop=True)
+
 '''
 * ***************************************************************************************** *
 *                                                                                           *
 * Function name:    update_csv_database                                                     *
 *                                                                                           *
-* Description:      Loads all ebay transaction report csvs from a directory, puts them into *
-*                   into their own pandas data frame, then merges the datafram, drops       * 
-*                   duplicates, then dumps the new dataframe to a new csv file              *
+* Description:      Loads all new ebay transaction report csvs from a directory and adds    *
+*                   their orders to the database csv. Only orders whose order numbers are   *
+*                   not in the database yet get appended, or inserted in date order if they *
+*                   are older than the newest order in the database. With compact, or when  *
+*                   there is no database yet, the whole database gets rebuilt instead: it   *
+*                   is merged with the new reports, duplicates are dropped, and the new     *
+*                   dataframe gets dumped to the csv file                                   *
 *                                                                                           *
 * Parameters:       str  reports_dir        :   The directory where the ebay csv reports are*
 *                   str  database_filename  :   What the output csv should be called        *
 *                   str  database_dir       :   Where the output csv should be stored       *
+*                   bool compact            :   Rewrite the whole database csv              *
+*                   [str] excluded_types    :   Transaction types to leave out              *
+*                   int   workers           :   Number of processes to parse reports with   *
 *                                                                                           *
-* Return Value:     pandas dataframe        :   Contains the merged data from all csvs found*
-*                                               in reports_dir                              *
+* Return Value:     pandas dataframe        :   The orders added to the database. When the  *
+*                                               database gets rebuilt this contains the     *
+*                                               merged data from all csvs found in          *
+*                                               reports_dir                                 *
 *                                                                                           *
 * ***************************************************************************************** *
 '''
-def update_csv_database(reports_dir='./ebay_reports/', database_filename='ebay.csv', database_dir='./'):
+def update_csv_database(reports_dir='./ebay_reports/', database_filename='ebay.csv', database_dir='./', compact=False, excluded_types=EXCLUDED_TYPES, workers=1):
     report_files = glob.glob((reports_dir + '*.{}').format('csv')) # Load all csv files that are in the reports_dir 
-    cached_reports_filename = 'cached_reports.txt' # This file stores the csv files that have alread been merged into the database csv
-    cached_reports = []
+
+    # The manifest stores the reports that have already been merged into the database csv
+    manifest = load_report_manifest(reports_dir)
+    new_reports = find_new_reports(report_files, manifest)
+    new_report_files = [path for path, file_hash in new_reports]
     
-    cached_reports_file_exists = False; # Flips to true if cached_reports.txt already exists so that the new reports can be appended 
+    # Stores the order numbers already in the database so new reports can be checked for
+    # duplicates without loading the database
+    orders_index_filename = os.path.splitext(database_filename)[0] + '_orders.json'
 
-    if os.path.isfile(reports_dir + cached_reports_filename):
-        cached_reports_file_exists = True;
-        
-        # Read the names of all the csv files this program has already seen on past runs
-        cached_reports_file = open(reports_dir + cached_reports_filename, 'r')
-        cached_reports = [x.strip() for x in cached_reports_file.readlines()]
-        cached_reports_file.close()
+    if compact or not os.path.isfile(database_dir + database_filename):
+        df = compact_csv_database(new_report_files, database_dir + database_filename, excluded_types, workers)
+        write_orders_index(database_dir + orders_index_filename, df)
+        record_new_reports(manifest, new_reports)
+        save_report_manifest(reports_dir, manifest)
+        return df
+
+    # Nothing has changed since the last run, so the database does not need to be touched
+    if not new_reports:
+        save_report_manifest(reports_dir, manifest)
+        return pd.DataFrame()
+
+    order_numbers, last_date = load_orders_index(database_dir + orders_index_filename, database_dir + database_filename)
+
+    # Drop any orders already in the database
+    new_df = read_ebay_reports(new_report_files, excluded_types, workers=workers)
+    new_df = new_df[~new_df['Order number'].isin(order_numbers)]
+
+    record_new_reports(manifest, new_reports)
+
+    if new_df.empty:
+        save_report_manifest(reports_dir, manifest)
+        return new_df
+
+    new_df['Transaction creation date'] = pd.to_datetime(new_df['Transaction creation date'], format='mixed')
+    new_df = new_df.sort_values(by='Transaction creation date', kind='stable')
+    
+    # Line the new rows up with the columns already in the database
+    with open(database_dir + database_filename, 'r', newline='') as infile:
+        header = csv.reader(infile, delimiter=',', quotechar='"').__next__()
+
+    extra_cols = [col for col in new_df.columns if col not in header]
+    if extra_cols:
+        print('New report columns', extra_cols, 'are not in the database, run with compact to add them')
+
+    new_df = new_df.reindex(columns=header)
+    new_csv = new_df.to_csv(index=False, header=False, lineterminator='\n')
+    new_rows = list(csv.reader(new_csv.splitlines(), delimiter=',', quotechar='"'))
+
+    date_i = header.index('Transaction creation date')
+    first_new_date = min(row[date_i] for row in new_rows)
+    last_new_date = max(row[date_i] for row in new_rows)
+
+    # Dates are written in ISO format so they sort as strings
+    if last_date is None or first_new_date >= last_date:
+        with open(database_dir + database_filename, 'a', newline='') as outfile:
+            outfile.write(new_csv)
     else:
-        # If the program has not seen any report files yet, it should create the cached_reports.txt file
-        # then store the names of the new reports that are being ingested on this run
-        cached_reports_file = open(reports_dir + cached_reports_filename, 'w')
+        merge_insert_rows(database_dir + database_filename, new_rows, date_i)
+
+    order_numbers.update(new_df['Order number'])
+    save_orders_index(database_dir + orders_index_filename, order_numbers, max(last_date or '', last_new_date))
+    save_report_manifest(reports_dir, manifest)
+
+    return new_df
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    compact_csv_database                                                    *
+*                                                                                           *
+* Description:      Loads the database csv and the new reports into a pandas data frame,    *
+*                   drops duplicates, then dumps the new dataframe over the database csv    *
+*                                                                                           *
+* Parameters:       [str] new_reports   :   Paths of the ebay reports to merge in           *
+*                   str   database_path :   Path of the database csv                        *
+*                   [str] excluded_types:   Transaction types to leave out                  *
+*                   int   workers       :   Number of processes to parse reports with       *
+*                                                                                           *
+* Return Value:     pandas dataframe    :   Contains the merged data from the database and  *
+*                                           the new reports                                 *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def compact_csv_database(new_reports, database_path, excluded_types=EXCLUDED_TYPES, workers=1):
+    # Check if we have already created a database csv in the past, if not, start from just the reports
+    df = None
+    if os.path.isfile(database_path):
+        # load current database into memory
+        df = pd.read_csv(database_path, dtype=REPORT_DTYPES, na_values=REPORT_NA_VALUES)
+        df['Transaction creation date'] = pd.to_datetime(df['Transaction creation date'], format='mixed')
+    
+    df = read_ebay_reports(new_reports, excluded_types, df, workers)
+
+    # Sort the database by date
+    df['Transaction creation date'] = pd.to_datetime(df['Transaction creation date'], format='mixed')
+    df.sort_values(by='Transaction creation date', kind='stable', inplace=True) 
+
+    df.to_csv(database_path, mode='w', index=False)
+    save_database_cache(df.reset_index(drop=True), os.path.splitext(database_path)[0] + '.npz')
+
+    return df
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    load_report_manifest                                                    *
+*                                                                                           *
+* Description:      Reads the manifest of the reports that have already been merged into the*
+*                   database. "files" maps the path of each report to the sha256 hash, size *
+*                   and modification time of its contents, and "reports" is the set of the  *
+*                   hashes of every merged report. A manifest is started from               *
+*                   cached_reports.txt if there is not one yet                              *
+*                                                                                           *
+* Parameters:       str reports_dir :   The directory where the ebay csv reports are        *
+*                                                                                           *
+* Return Value:     dict            :   The manifest                                        *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def load_report_manifest(reports_dir):
+    if os.path.isfile(reports_dir + REPORT_MANIFEST_FILENAME):
+        with open(reports_dir + REPORT_MANIFEST_FILENAME, 'r') as infile:
+            manifest = json.load(infile)
+
+        # Saved as a list, older manifests kept a dict keyed by hash
+        manifest['reports'] = set(manifest['reports'])
+        return manifest
+
+    manifest = {'files': {}, 'reports': set()}
+
+    # Older versions stored the names of the merged reports in cached_reports.txt, they do not
+    # need to be merged again
+    cached_reports_filename = 'cached_reports.txt'
+    if os.path.isfile(reports_dir + cached_reports_filename):
+        with open(reports_dir + cached_reports_filename, 'r') as cached_reports_file:
+            cached_reports = [x.strip() for x in cached_reports_file.readlines()]
+
+        for file in cached_reports:
+            if os.path.isfile(file):
+                record_report_file(manifest, file, hash_report_file(file))
+                manifest['reports'].add(manifest['files'][file]['sha256'])
+    
+    return manifest
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    save_report_manifest                                                    *
+*                                                                                           *
+* Description:      Writes the manifest of merged reports out to the reports directory      *
+*                                                                                           *
+* Parameters:       str  reports_dir    :   The directory where the ebay csv reports are    *
+*                   dict manifest       :   The manifest from load_report_manifest          *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def save_report_manifest(reports_dir, manifest):
+    with open(reports_dir + REPORT_MANIFEST_FILENAME, 'w') as outfile:
+        json.dump({'files': manifest['files'], 'reports': sorted(manifest['reports'])}, outfile, indent=1)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    hash_report_file                                                        *
+*                                                                                           *
+* Description:      Computes the sha256 hash of the contents of a file                      *
+*                                                                                           *
+* Parameters:       str path    :   Path of the file                                        *
+*                                                                                           *
+* Return Value:     str         :   The hash as hex                                         *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def hash_report_file(path):
+    file_hash = hashlib.sha256()
+
+    with open(path, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    record_report_file                                                      *
+*                                                                                           *
+* Description:      Stores the hash, size and modification time of a report in the manifest *
+*                                                                                           *
+* Parameters:       dict manifest   :   The manifest from load_report_manifest              *
+*                   str  path       :   Path of the report                                  *
+*                   str  file_hash  :   The hash of the report from hash_report_file        *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def record_report_file(manifest, path, file_hash):
+    stat = os.stat(path)
+    manifest['files'][path] = {'sha256': file_hash, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    find_new_reports                                                        *
+*                                                                                           *
+* Description:      Finds the reports whose contents have not been merged into the database *
+*                   yet. A report with the same size and modification time as in the       *
+*                   manifest is not opened, otherwise it gets hashed so renamed or          *
+*                   downloaded again reports are still recognized, and edited reports are   *
+*                   merged again                                                            *
+*                                                                                           *
+* Parameters:       [str] report_files  :   Paths of all of the reports                     *
+*                   dict  manifest      :   The manifest from load_report_manifest, renamed *
+*                                           reports get recorded in it                      *
+*                                                                                           *
+* Return Value:     [[str, str]]        :   The path and hash of each new report            *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def find_new_reports(report_files, manifest):
+    new_reports = []
+    new_hashes = set()
 
-        for file in report_files:
-            cached_reports_file.write(file)
-            cached_reports_file.write('\n')
+    for path in report_files:
+        stat = os.stat(path)
+        entry = manifest['files'].get(path)
 
-        cached_reports_file.close()
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            continue
+
+        file_hash = hash_report_file(path)
+
+        if file_hash in manifest['reports']:
+            record_report_file(manifest, path, file_hash)
+        elif file_hash not in new_hashes:
+            new_hashes.add(file_hash)
+            new_reports.append([path, file_hash])
+
+    return new_reports
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    record_new_reports                                                      *
+*                                                                                           *
+* Description:      Adds reports that have been merged into the database to the manifest    *
+*                                                                                           *
+* Parameters:       dict         manifest       :   The manifest from load_report_manifest  *
+*                   [[str, str]] new_reports    :   The reports from find_new_reports       *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def record_new_reports(manifest, new_reports):
+    for path, file_hash in new_reports:
+        record_report_file(manifest, path, file_hash)
+        manifest['reports'].add(file_hash)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    write_orders_index                                                      *
+*                                                                                           *
+* Description:      Saves the order numbers and the newest date in a database dataframe to  *
+*                   the orders index file                                                   *
+*                                                                                           *
+* Parameters:       str              path   :   Path of the orders index file               *
+*                   pandas dataframe df     :   The whole database                          *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def write_orders_index(path, df):
+    last_date = None
+    if not df.empty:
+        # Format the date the same way to_csv wrote it to the database
+        last_date = list(csv.reader(df[['Transaction creation date']].tail(1).to_csv(index=False, header=False).splitlines()))[0][0]
     
-    # Diff of all report files and the reports that have already been cached to get the reports we have not
-    # seen yet
-    new_reports = [file for file in report_files if file not in cached_reports]     
+    save_orders_index(path, set(df['Order number'].astype(str)) if not df.empty else set(), last_date)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    save_orders_index                                                       *
+*                                                                                           *
+* Description:      Writes the order numbers in the database and the date of the newest     *
+*                   order to a json file                                                    *
+*                                                                                           *
+* Parameters:       str   path          :   Path of the orders index file                   *
+*                   {str} order_numbers :   Every order number in the database              *
+*                   str   last_date     :   Date of the newest order as written in the csv  *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def save_orders_index(path, order_numbers, last_date):
+    with open(path, 'w') as outfile:
+        json.dump({'last_date': last_date, 'order_numbers': sorted(order_numbers)}, outfile)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    load_orders_index                                                       *
+*                                                                                           *
+* Description:      Reads the orders index file. If it does not exist yet it gets built from*
+*                   the order number and date columns of the database csv                   *
+*                                                                                           *
+* Parameters:       str path            :   Path of the orders index file                   *
+*                   str database_path   :   Path of the database csv                        *
+*                                                                                           *
+* Return Value:     {str} order_numbers :   Every order number in the database              *
+*                   str   last_date     :   Date of the newest order, None if it is empty   *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def load_orders_index(path, database_path):
+    if os.path.isfile(path):
+        with open(path, 'r') as infile:
+            orders_index = json.load(infile)
+
+        return set(orders_index['order_numbers']), orders_index['last_date']
     
-    if new_reports and cached_reports_file_exists: # If the file exist, and there are new reports 
-                                                   # append the filenames to the cached_reports.txt file
-        cached_reports_file = open(reports_dir + cached_reports_filename, 'a')
-        for filename in new_reports:
-            cached_reports_file.write(filename)
-            cached_reports_file.write('\n')
+    order_numbers = set()
+    last_date = None
+
+    with open(database_path, 'r', newline='') as infile:
+        incsv = csv.reader(infile, delimiter=',', quotechar='"')
+        header = incsv.__next__()
+        order_i = header.index('Order number')
+        date_i = header.index('Transaction creation date')
+
+        for row in incsv:
+            order_numbers.add(row[order_i])
+            if last_date is None or row[date_i] > last_date:
+                last_date = row[date_i]
     
-    # Check if we have already created a database csv in the past, if not, create an empty dataframe
-    if not os.path.isfile(database_dir + database_filename):
-        df = pd.DataFrame()
-    else:
-        # load current database into memory
-        df = pd.read_csv(database_dir + database_filename)
+    save_orders_index(path, order_numbers, last_date)
+
+    return order_numbers, last_date
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    merge_insert_rows                                                       *
+*                                                                                           *
+* Description:      Inserts rows into the database csv so that it stays sorted by date. The *
+*                   csv is streamed into a temporary file with the new rows merged in, which*
+*                   then replaces the database                                              *
+*                                                                                           *
+* Parameters:       str     database_path   :   Path of the database csv                    *
+*                   [[str]] new_rows        :   Rows to insert, sorted by date              *
+*                   int     date_i          :   Index of the date column                    *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def merge_insert_rows(database_path, new_rows, date_i):
+    temp_path = database_path + '.tmp'
+
+    with open(database_path, 'r', newline='') as infile, open(temp_path, 'w', newline='') as outfile:
+        incsv = csv.reader(infile, delimiter=',', quotechar='"')
+        outcsv = csv.writer(outfile, delimiter=',', quotechar='"', lineterminator='\n')
+        outcsv.writerow(incsv.__next__())
+        
+        new_i = 0
+        for row in incsv:
+            # Orders already in the database come before new orders on the same date
+            while new_i < len(new_rows) and new_rows[new_i][date_i] < row[date_i]:
+                outcsv.writerow(new_rows[new_i])
+                new_i += 1
+
+            outcsv.writerow(row)
+        
+        outcsv.writerows(new_rows[new_i:])
+
+    os.replace(temp_path, database_path)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    load_csv_database                                                       *
+*                                                                                           *
+* Description:      Loads the database csv into a pandas data frame. The parsed data frame  *
+*                   is cached in a binary .npz file next to the csv, which gets loaded      *
+*                   instead of the csv as long as it is newer than the csv                  *
+*                                                                                           *
+* Parameters:       str  database_filename  :   What the database csv is called             *
+*                   str  database_dir       :   Where the database csv is stored            *
+*                                                                                           *
+* Return Value:     pandas dataframe        :   The whole database                          *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def load_csv_database(database_filename='ebay.csv', database_dir='./'):
+    database_path = database_dir + database_filename
+    cache_path = database_dir + os.path.splitext(database_filename)[0] + '.npz'
+
+    if os.path.isfile(cache_path) and os.stat(cache_path).st_mtime_ns >= os.stat(database_path).st_mtime_ns:
+        df = load_database_cache(cache_path)
+        if df is not None:
+            return df
+
+    df = pd.read_csv(database_path, dtype=REPORT_DTYPES, na_values=REPORT_NA_VALUES)
+    df['Transaction creation date'] = pd.to_datetime(df['Transaction creation date'], format='mixed')
+
+    save_database_cache(df, cache_path)
+
+    return df
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    save_database_cache                                                     *
+*                                                                                           *
+* Description:      Writes a data frame to a .npz file with one typed array per column.     *
+*                   Numbers keep their numpy types and dates are stored as int64. Text      *
+*                   columns are stored as the integer codes from pd.factorize, -1 for a     *
+*                   missing cell, plus their distinct values as one NUL terminated utf-8    *
+*                   string, so each distinct value is only stored once and nothing is       *
+*                   pickled                                                                 *
+*                                                                                           *
+* Parameters:       pandas dataframe df     :   The database                                *
+*                   str              path   :   Path of the .npz file                       *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def save_database_cache(df, path):
+    arrays = {'version': np.array(DATABASE_CACHE_VERSION), 'columns': np.array(df.columns, dtype=str)}
+
+    for i, col in enumerate(df.columns):
+        if pd.api.types.is_datetime64_dtype(df[col]):
+            arrays['col%d_dates' % i] = df[col].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            arrays['col%d' % i] = df[col].to_numpy()
+        else:
+            codes, values = pd.factorize(df[col])
+            arrays['col%d_codes' % i] = codes.astype(np.min_scalar_type(-len(values) - 1))
+            arrays['col%d_values' % i] = np.frombuffer(''.join(str(value) + '\0' for value in values).encode('utf-8'), dtype=np.uint8)
     
-    # There are 11 metadata rows in ebay transaction reports as of 11/8/23
-    new_reports_dfs = [pd.read_csv(file, skiprows=11) for file in new_reports] # load all of the new reports into memory
+    # Written to a temporary file first so that a half written cache never looks newer than the csv
+    with open(path + '.tmp', 'wb') as outfile:
+        np.savez(outfile, **arrays)
+
+    os.replace(path + '.tmp', path)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    load_database_cache                                                     *
+*                                                                                           *
+* Description:      Reads a data frame written by save_database_cache                       *
+*                                                                                           *
+* Parameters:       str path    :   Path of the .npz file                                   *
+*                                                                                           *
+* Return Value:     pandas dataframe    :   The database, None if the cache was written by  *
+*                                           another version                                 *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def load_database_cache(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        if 'version' not in arrays or int(arrays['version']) != DATABASE_CACHE_VERSION:
+            return None
+
+        data = {}
+
+        for i, col in enumerate(arrays['columns']):
+            if 'col%d_dates' % i in arrays:
+                values = arrays['col%d_dates' % i].view('datetime64[ns]')
+            elif 'col%d_codes' % i in arrays:
+                codes = arrays['col%d_codes' % i]
+                text = arrays['col%d_values' % i].tobytes().decode('utf-8')
+
+                # Every value ends in a NUL, so the last piece of the split is empty. It is replaced with
+                # the value for missing cells, which code -1 picks
+                values = text.split('\0')
+                values[-1] = np.nan
+                values = np.array(values, dtype=object)[codes]
+            else:
+                values = arrays['col%d' % i]
+            
+            data[str(col)] = values
+
+    return pd.DataFrame(data)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    stream_ebay_reports                                                     *
+*                                                                                           *
+* Description:      Reads ebay transaction report csvs a chunk at a time, dropping the rows *
+*                   with an excluded type and orders that were already seen in an earlier   *
+*                   chunk. An order has the same date in every report it shows up in, so    *
+*                   the dates each report covers are found first, and the order numbers of  *
+*                   a day are only kept while a report still to be read covers that day.    *
+*                   Memory grows with how much the reports overlap, not with the number of  *
+*                   reports                                                                 *
+*                                                                                           *
+* Parameters:       [str] report_files      :   Paths of the ebay reports to read           *
+*                   [str] excluded_types    :   Transaction types to leave out              *
+*                   int   chunksize         :   Number of rows to read at a time            *
+*                                                                                           *
+* Return Value:     generator of pandas dataframe   :   The orders in each chunk            *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def stream_ebay_reports(report_files, excluded_types=EXCLUDED_TYPES, chunksize=STREAM_CHUNKSIZE):
+    windows = [get_report_window(file, chunksize) for file in report_files]
+
+    # The order numbers seen so far keyed by the day of the order
+    seen_days = {}
+
+    for i, file in enumerate(report_files):
+        window = windows[i]
+        later_windows = [later for later in windows[i:] if later is not None]
+        seen_days = {day: orders for day, orders in seen_days.items() if any(start <= day <= end for start, end in later_windows)}
+
+        if window is None:
+            continue
+
+        seen_orders = set().union(*[orders for day, orders in seen_days.items() if window[0] <= day <= window[1]])
+
+        # There are 11 metadata rows in ebay transaction reports as of 11/8/23
+        with pd.read_csv(file, skiprows=11, dtype=REPORT_DTYPES, na_values=REPORT_NA_VALUES, chunksize=chunksize) as chunks:
+            for chunk in chunks:
+                chunk = chunk[~chunk['Type'].isin(excluded_types)]
+                chunk = chunk.drop_duplicates(subset='Order number', keep='first')
+                chunk = chunk[~chunk['Order number'].isin(seen_orders)]
+
+                days = pd.to_datetime(chunk['Transaction creation date'], format='mixed').dt.normalize()
+                for day, orders in chunk['Order number'].groupby(days, sort=False):
+                    seen_days.setdefault(day, set()).update(orders)
+                seen_orders.update(chunk['Order number'])
+
+                if not chunk.empty:
+                    yield chunk
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    get_report_window                                                       *
+*                                                                                           *
+* Description:      Finds the first and last day of the transactions in an ebay report,     *
+*                   reading only the date column a chunk at a time                          *
+*                                                                                           *
+* Parameters:       str report_file :   Path of the ebay report                             *
+*                   int chunksize   :   Number of rows to read at a time                    *
+*                                                                                           *
+* Return Value:     (pandas Timestamp, pandas Timestamp)    :   The first and last day,     *
+*                                                               None for an empty report    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def get_report_window(report_file, chunksize=STREAM_CHUNKSIZE):
+    window = None
+
+    with pd.read_csv(report_file, skiprows=11, usecols=['Transaction creation date'], chunksize=chunksize) as chunks:
+        for chunk in chunks:
+            days = pd.to_datetime(chunk['Transaction creation date'], format='mixed').dt.normalize()
+            if days.empty:
+                continue
+
+            if window is None:
+                window = (days.min(), days.max())
+            else:
+                window = (min(window[0], days.min()), max(window[1], days.max()))
+
+    return window
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    stream_csv_database                                                     *
+*                                                                                           *
+* Description:      Reads the database csv a chunk at a time                                *
+*                                                                                           *
+* Parameters:       str  database_filename  :   What the database csv is called             *
+*                   str  database_dir       :   Where the database csv is stored            *
+*                   int  chunksize          :   Number of rows to read at a time            *
+*                                                                                           *
+* Return Value:     generator of pandas dataframe   :   The orders in each chunk            *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def stream_csv_database(database_filename='ebay.csv', database_dir='./', chunksize=STREAM_CHUNKSIZE):
+    with pd.read_csv(database_dir + database_filename, dtype=REPORT_DTYPES, na_values=REPORT_NA_VALUES, chunksize=chunksize) as chunks:
+        for chunk in chunks:
+            yield chunk
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    read_csv_header                                                         *
+*                                                                                           *
+* Description:      Reads only the header row of a csv file                                 *
+*                                                                                           *
+* Parameters:       str path        :   Path of the csv file                                *
+*                   int skiprows    :   Number of rows before the header, 11 for ebay       *
+*                                       transaction reports                                 *
+*                                                                                           *
+* Return Value:     [str]           :   The header                                          *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def read_csv_header(path, skiprows=0):
+    return list(pd.read_csv(path, skiprows=skiprows, nrows=0).columns)
+     
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    to_float                                                                *
+*                                                                                           *
+* Description:      Converts a value from the ebay csv to a float                           *
+*                                                                                           *
+* Parameters:       str value   :   The value to convert                                    *
+*                                                                                           *
+* Return Value:     float       :   NaN if the value is not a number                        *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    load_report_store                                                       *
+*                                                                                           *
+* Description:      Loads the saved monthly reports, see StatsGen.set_report_store          *
+*                                                                                           *
+* Parameters:       str path    :   Path of the store                                       *
+*                                                                                           *
+* Return Value:     dict        :   The fingerprint of the cost tables the reports were     *
+*                                   computed with under 'tables', the tables themselves     *
+*                                   under 'lookup_table' and 'alias_table', and the reports *
+*                                   keyed by 'YYYY-MM' under 'months'                       *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def load_report_store(path):
+    if os.path.isfile(path):
+        with open(path, 'r') as infile:
+            return json.load(infile)
+
+    return {'tables': None, 'months': {}}
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    save_report_store                                                       *
+*                                                                                           *
+* Description:      Writes the saved monthly reports out to a file                          *
+*                                                                                           *
+* Parameters:       str  path   :   Path of the store                                       *
+*                   dict store  :   The store, in the format from load_report_store         *
+*                                                                                           *
+* Return Value:     none                                                                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def save_report_store(path, store):
+    with open(path, 'w') as outfile:
+        json.dump(store, outfile, indent=1)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    get_month_fingerprints                                                  *
+*                                                                                           *
+* Description:      Hashes the orders of each month, so that a month whose orders have not  *
+*                   changed can be found without computing its report                       *
+*                                                                                           *
+* Parameters:       numpy array ordinals    :   The date of each order as a day ordinal     *
+*                   numpy array titles      :   The item title of each order                *
+*                   numpy array subtotals   :   The item subtotal of each order             *
+*                   numpy array shipping    :   The shipping and handling of each order     *
+*                   numpy array final_fees  :   The fixed final value fee of each order     *
+*                   numpy array value_fees  :   The variable final value fee of each order  *
+*                   numpy array locations   :   The buyer's state and city of each order,   *
+*                                               joined into one string                      *
+*                                                                                           *
+* Return Value:     {(int, int): str}   :   The hash as hex keyed by (year, month)          *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def get_month_fingerprints(ordinals, titles, subtotals, shipping, final_fees, value_fees, locations):
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+
+    # Months counted from January 1970, 719163 is the ordinal of 1970-01-01
+    months = (ordinals - 719163).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+    # Group the orders by month while keeping their order within the month
+    order = np.argsort(months, kind='stable')
+    month_ids, starts = np.unique(months[order], return_index=True)
+    ends = list(starts[1:]) + [len(order)]
+
+    fingerprints = {}
+    for month_id, start, end in zip(month_ids, starts, ends):
+        rows = order[start:end]
+
+        hasher = hashlib.sha256()
+        hasher.update(ordinals[rows].tobytes())
+        hasher.update('\n'.join(np.asarray(titles, dtype=object)[rows]).encode('utf-8'))
+        hasher.update('\n'.join(np.asarray(locations, dtype=object)[rows]).encode('utf-8'))
+        for values in [subtotals, shipping, final_fees, value_fees]:
+            values = np.asarray(values, dtype=float)[rows]
+            hasher.update(np.where(np.isnan(values), np.nan, values).tobytes()) # Every NaN hashes the same
+
+        fingerprints[(int(month_id) // 12 + 1970, int(month_id) % 12 + 1)] = hasher.hexdigest()
+
+    return fingerprints
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    get_row_location                                                        *
+*                                                                                           *
+* Description:      Gets the state and city of the buyer from a row of the csv database     *
+*                                                                                           *
+* Parameters:       [str] row       :   A row of data from the ebay CSV files               *
+*                   int   state_i   :   Index of the Buyer State column, None if missing    *
+*                   int   city_i    :   Index of the Buyer City column, None if missing     *
+*                                                                                           *
+* Return Value:     (str, str)      :   The state and city, '' for either one that is       *
+*                                       missing                                             *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def get_row_location(row, state_i, city_i):
+    state = row[state_i] if state_i is not None else ''
+    city = row[city_i] if city_i is not None else ''
+
+    return (state, city)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    factorize_locations                                                     *
+*                                                                                           *
+* Description:      Gives every distinct (state, city) of the buyers in a dataframe a code, *
+*                   so the locations can be counted with np.bincount instead of grouping    *
+*                   the text for every report                                               *
+*                                                                                           *
+* Parameters:       pandas dataframe orders :   The orders                                  *
+*                                                                                           *
+* Return Value:     (numpy array, [(str, str)]) :   The code of each order, and the         *
+*                                                   location of each code. '' stands in for *
+*                                                   a missing state or city                 *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def factorize_locations(orders):
+    # Databases made before the buyer's location was kept do not have these columns
+    def get_text(col):
+        if col not in orders.columns:
+            return pd.Series('', index=orders.index)
+        return orders[col].astype(object).fillna('').astype(str)
+
+    state_codes, states = pd.factorize(get_text('Buyer State'))
+    city_codes, cities = pd.factorize(get_text('Buyer City'))
+    codes, pairs = pd.factorize(state_codes.astype(np.int64) * len(cities) + city_codes)
+
+    return codes, [(states[pair // len(cities)], cities[pair % len(cities)]) for pair in pairs]
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Class name:       OrderStore                                                              *
+*                                                                                           *
+* Description:      Holds the orders of the ebay database in typed columns so that each     *
+*                   value is only converted from a string once. Dates are stored as ordinals*
+*                   and money as doubles in parallel arrays, and item titles are stored once*
+*                   in self.titles with each order holding the index of its title           *
+*                                                                                           *
+* Parameters:      [str]   header   : The header of the csv database                        *
+*                  [[str]] rows     : The rows of the csv database, or the database as a    *
+*                                     dataframe from load_csv_database                      *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+class OrderStore:
+    def __init__(self, header, rows=()):
+        # Indexes of the needed data in a row
+        self.date_i = header.index('Transaction creation date')
+        self.subtotal_i = header.index('Item subtotal')
+        self.item_name_i = header.index('Item title')
+        self.shipping_i = header.index('Shipping and handling')
+        self.final_fee_i = header.index('Final Value Fee - fixed')
+        self.value_fee_i = header.index('Final Value Fee - variable')
+
+        # Databases made before the buyer's location was kept do not have these columns
+        self.state_i = header.index('Buyer State') if 'Buyer State' in header else None
+        self.city_i = header.index('Buyer City') if 'Buyer City' in header else None
+
+        self.dates = array('l')
+        self.item_ids = array('l')
+        self.subtotals = array('d')
+        self.shipping = array('d')
+        self.final_fees = array('d')
+        self.value_fees = array('d')
+
+        # Every distinct item title, and the index of each title in that list
+        self.titles = []
+        self.title_ids = {}
+
+        # The same for every distinct (state, city) of the buyers
+        self.location_ids = array('l')
+        self.locations = []
+        self.location_index = {}
+
+        # There are only a few thousand distinct days, so each one only gets parsed once
+        self.date_ordinals = {}
+
+        if isinstance(rows, pd.DataFrame):
+            self.append_frame(rows)
+        else:
+            for row in rows:
+                self.append_row(row)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    append_row                                                              *
+    *                                                                                           *
+    * Description:      Converts a row of the csv database and adds it to the store             *
+    *                                                                                           *
+    * Parameters:       [str]  row  :   A row of data from the ebay CSV files                   *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def append_row(self, row):
+        date_str = row[self.date_i]
+        if date_str not in self.date_ordinals:
+            self.date_ordinals[date_str] = dateParser.parse_date(date_str).toordinal()
+
+        title = row[self.item_name_i]
+        if title not in self.title_ids:
+            self.title_ids[title] = len(self.titles)
+            self.titles.append(title)
+
+        location = get_row_location(row, self.state_i, self.city_i)
+        if location not in self.location_index:
+            self.location_index[location] = len(self.locations)
+            self.locations.append(location)
+
+        self.dates.append(self.date_ordinals[date_str])
+        self.item_ids.append(self.title_ids[title])
+        self.location_ids.append(self.location_index[location])
+        self.subtotals.append(to_float(row[self.subtotal_i]))
+        self.shipping.append(to_float(row[self.shipping_i]))
+        self.final_fees.append(to_float(row[self.final_fee_i]))
+        self.value_fees.append(to_float(row[self.value_fee_i]))
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    append_frame                                                            *
+    *                                                                                           *
+    * Description:      Adds every order in a dataframe to the store at once. The columns are   *
+    *                   already typed, so only the distinct titles and locations get looked up  *
+    *                                                                                           *
+    * Parameters:       pandas dataframe df :   Orders from load_csv_database                   *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def append_frame(self, df):
+        dates = pd.to_datetime(df['Transaction creation date'], format='mixed').dt.normalize()
+        self.dates.extend((dates.to_numpy(dtype='datetime64[D]').astype(np.int64) + 719163).tolist()) # The ordinal of 1970-01-01
+
+        # Empty cells are read in as NaN, in the csv rows they are ''
+        title_codes, titles = pd.factorize(df['Item title'].astype(object).fillna('').astype(str))
+        for title in titles:
+            if title not in self.title_ids:
+                self.title_ids[title] = len(self.titles)
+                self.titles.append(title)
+
+        title_ids = np.array([self.title_ids[title] for title in titles], dtype=np.int64)
+        self.item_ids.extend(title_ids[title_codes].tolist())
+
+        location_codes, locations = factorize_locations(df)
+
+        location_ids = []
+        for location in locations:
+            if location not in self.location_index:
+                self.location_index[location] = len(self.locations)
+                self.locations.append(location)
+            location_ids.append(self.location_index[location])
+
+        self.location_ids.extend(np.array(location_ids, dtype=np.int64)[location_codes].tolist())
+
+        for values, col in [(self.subtotals, 'Item subtotal'), (self.shipping, 'Shipping and handling'), 
+                            (self.final_fees, 'Final Value Fee - fixed'), (self.value_fees, 'Final Value Fee - variable')]:
+            values.extend(pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float).tolist())
+
+    def __len__(self):
+        return len(self.dates)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Class name:       MarginStats                                                             *
+*                                                                                           *
+* Description:      Keeps running statistics of a stream of values in constant memory: the  *
+*                   count, sum, min, max and variance (with Welford's algorithm). Two of    *
+*                   them can be merged to get the statistics of both streams together       *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+class MarginStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+        # Running mean and sum of squared differences from the mean, for the variance
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    add                                                                     *
+    *                                                                                           *
+    * Description:      Adds one value to the statistics                                        *
+    *                                                                                           *
+    * Parameters:       float value :   The value to add                                        *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    add_array                                                               *
+    *                                                                                           *
+    * Description:      Adds a numpy array of values to the statistics. The sum is taken in     *
+    *                   order so it comes out the same as calling add for each value            *
+    *                                                                                           *
+    * Parameters:       numpy array values  :   The values to add                               *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def add_array(self, values):
+        if len(values) == 0:
+            return
+
+        other = MarginStats()
+        other.count = len(values)
+        other.min = float(values.min())
+        other.max = float(values.max())
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+
+        total = float(np.cumsum(np.concatenate(([self.total], values)))[-1])
+        self.merge(other)
+        self.total = total
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    merge                                                                   *
+    *                                                                                           *
+    * Description:      Adds the statistics of another MarginStats to this one                  *
+    *                                                                                           *
+    * Parameters:       MarginStats other   :   The statistics to add                           *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def merge(self, other):
+        if other.count == 0:
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_mean                                                                *
+    *                                                                                           *
+    * Description:      returns the average of the values, 0 if there are none                  *
+    *                                                                                           *
+    * Return Value:     float                                                                   *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_mean(self):
+        if self.count == 0:
+            return 0.0
+
+        return self.total / self.count
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_variance                                                            *
+    *                                                                                           *
+    * Description:      returns the sample variance of the values, 0 if there are less than two *
+    *                                                                                           *
+    * Return Value:     float                                                                   *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_variance(self):
+        if self.count < 2:
+            return 0.0
+
+        return self.m2 / (self.count - 1)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Class name:       EbayReport                                                              *
+*                                                                                           *
+* Description:      Contains all statistics about ebay transactions over a given time period*
+*                   it memorizes all rows that are passed into it's visit_row function. Any *
+*                   rows not within the start_date and end_date will be ignored             *
+*                                                                                           *
+* Parameters:      [str] header             : The header of the csv database                *
+*                  str   name               : An identifier for when this report is printed *
+*                  ItemManager item_man     : The class responsible for keeping track of    *
+*                                             item costs and if an item should be counted   *
+*                  datetime date start_date : The first date(inclusive) that should be      *
+*                                             included in the report                        *
+*                  datetime date end_date   : The last date(inclusive) that should be       *
+*                                             included in the report                        *
+*                  RunContext run_context   : The date 'end' resolves to, defaults to       *
+*                                             dateParser.get_run_context                    *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+class EbayReport:
+    def __init__(self, header, item_man, name, start_date, end_date, run_context=None):
+        self.item_man = item_man
+        self.run_context = run_context if run_context is not None else dateParser.get_run_context()
+
+        self.name = name
+        
+        # Indexes of the needed data in a row
+        self.date_i = header.index('Transaction creation date')
+        self.subtotal_i = header.index('Item subtotal')
+        self.item_name_i = header.index('Item title')
+        self.shipping_i = header.index('Shipping and handling')
+        self.final_fee_i = header.index('Final Value Fee - fixed')
+        self.value_fee_i = header.index('Final Value Fee - variable')
+        self.state_i = header.index('Buyer State') if 'Buyer State' in header else None
+        self.city_i = header.index('Buyer City') if 'Buyer City' in header else None
+        
+        # Sumation variables
+        self.num_orders = 0
+        self.total_sales = 0.0
+        self.gross_profit = 0.0
+        self.item_costs = 0.0 
+        self.shipping_costs = 0.0
+
+        # Costs from the costs csv during the dates of the report, see StatsGen.set_materials_costs
+        self.materials_costs = 0.0
+        
+        # Running statistics of the profit margin of each order. This allows
+        # the calculation of average profit margin without keeping every order
+        self.margins = MarginStats()
+        
+        if start_date == 'begin':
+            self.start_date = datetime.date(1900, 1, 1)
+        else:
+            self.start_date = start_date 
+
+        if end_date == 'end':
+            self.end_date = self.run_context.today
+        else:
+            self.end_date = end_date 
+        
+        # TODO May have added bug here
+        self.first_date = datetime.datetime(1, 1, 1) 
+        self.last_date = datetime.datetime(1, 1, 1) 
+        
+        # A dictionary containing each seen item and how many times
+        # it was seen
+        self.items = {}
+
+        # How many orders were sent to each (state, city)
+        self.locations = {}
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    visit_row                                                               *
+    *                                                                                           *
+    * Description:      Memorizes the data in a row into the class and adds it to the statistics*
+    *                   that are computed                                                       *
+    *                                                                                           *
+    * Parameters:       [str]  row  :   A row of data from the ebay CSV files                   *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def visit_row(self, row):
+        item_cost = self.item_man.get_cost(row[self.item_name_i], row[self.date_i])
+        item_date = dateParser.parse_date(row[self.date_i])
+
+        self.add_row(row, item_cost, item_date)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    add_row                                                                 *
+    *                                                                                           *
+    * Description:      Same as visit_row, but takes the cost and date of the order already     *
+    *                   looked up so that one row can be added to many reports without looking  *
+    *                   them up again for each report                                           *
+    *                                                                                           *
+    * Parameters:       [str]  row              :   A row of data from the ebay CSV files       *
+    *                   float  item_cost        :   The cost of the item from the ItemManager   *
+    *                   datetime date item_date :   The date of the order                       *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def add_row(self, row, item_cost, item_date):
+        self.add_order(item_date, row[self.item_name_i], to_float(row[self.subtotal_i]), to_float(row[self.shipping_i]),
+                       to_float(row[self.final_fee_i]), to_float(row[self.value_fee_i]), item_cost, 
+                       get_row_location(row, self.state_i, self.city_i))
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    add_order                                                               *
+    *                                                                                           *
+    * Description:      Adds the values of one order to the statistics. Values that could not be*
+    *                   read from the csv are NaN                                               *
+    *                                                                                           *
+    * Parameters:       datetime date item_date :   The date of the order                       *
+    *                   str    item_name        :   The title of the item                       *
+    *                   float  subtotal         :   Item subtotal                               *
+    *                   float  shipping         :   Shipping and handling                       *
+    *                   float  final_fee        :   Final Value Fee - fixed                     *
+    *                   float  value_fee        :   Final Value Fee - variable                  *
+    *                   float  item_cost        :   The cost of the item from the ItemManager   *
+    *                   (str, str) location     :   The state and city of the buyer             *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def add_order(self, item_date, item_name, subtotal, shipping, final_fee, value_fee, item_cost, location=('', '')):
+        # Statistics should only be calculated for a row if the item exists in the item manager,
+        # and the date for the order is within the range start_date to end_date inclusive
+        if (item_cost != 'ignore' and item_cost != '-1' and item_cost != -1) and item_date >= self.start_date and item_date <= self.end_date:
+            if self.first_date == datetime.datetime(1, 1, 1): # Check if first_date is empty, if it is this is the first row we've seen
+                self.first_date = item_date
+                
+            self.last_date = item_date
+            
+            # Ocassionally ebay csvs don't have data in these cells for some reason. The statistics
+            # up to the first missing value still get counted
+            order_pofit = subtotal + final_fee + value_fee
+            if math.isnan(order_pofit):
+                print('Junk data, name=', item_name, ' - date=', item_date)
+                return
+
+            self.total_sales += subtotal
+
+            if math.isnan(shipping):
+                print('Junk data, name=', item_name, ' - date=', item_date)
+                return
+
+            self.shipping_costs += shipping
+
+            self.gross_profit += order_pofit
+
+            item_cost = to_float(item_cost)
+            if math.isnan(item_cost):
+                print('Junk data, name=', item_name, ' - date=', item_date)
+                return
+
+            self.item_costs += item_cost
+
+            # The margin of an item that costs nothing has no meaning
+            if item_cost != 0:
+                self.margins.add((order_pofit - item_cost) / item_cost)
+
+            self.num_orders += 1
+            
+            # If the item has been seen before, increment the count of it,
+            # otherwise create the entry
+            if item_name in self.items:
+                self.items[item_name] += 1
+            else:
+                self.items[item_name] = 1
+
+            self.locations[location] = self.locations.get(location, 0) + 1
+    
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    add_frame                                                               *
+    *                                                                                           *
+    * Description:      Adds the orders within start_date and end_date to the statistics at     *
+    *                   once. The orders are sorted by date, so the ones for this report are a  *
+    *                   slice of the columns found with a binary search and nothing gets copied *
+    *                   for the other dates                                                     *
+    *                                                                                           *
+    * Parameters:       FrameOrders orders  :   Orders with costs from attach_item_costs        *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def add_frame(self, orders):
+        start, end = orders.get_bounds(self.start_date, self.end_date)
+
+        if start == end:
+            return
+
+        # Frames can come in out of date order when streaming reports, so keep the earliest and latest
+        # dates of every frame rather than the last one
+        frame_first_date = orders.days[start].astype(datetime.date)
+        frame_last_date = orders.days[end - 1].astype(datetime.date)
+
+        if self.first_date == datetime.datetime(1, 1, 1): # Check if first_date is empty, if it is this is the first row we've seen
+            self.first_date = frame_first_date
+            self.last_date = frame_last_date
+        else:
+            self.first_date = min(self.first_date, frame_first_date)
+            self.last_date = max(self.last_date, frame_last_date)
+
+        # Sums are accumulated in row order so that they come out the same as visit_row's
+        def running_sum(start, values):
+            return float(np.cumsum(np.concatenate(([start], values)))[-1])
+
+        # Rows missing data in these cells are junk, the same as in visit_row 
+        has_profit = orders.has_profit[start:end]
+        complete = orders.complete[start:end]
+
+        self.total_sales = running_sum(self.total_sales, orders.subtotals[start:end][has_profit])
+        self.shipping_costs = running_sum(self.shipping_costs, orders.shipping[start:end][complete])
+        self.gross_profit = running_sum(self.gross_profit, orders.profits[start:end][complete])
+        self.item_costs = running_sum(self.item_costs, orders.item_costs[start:end][complete])
+
+        self.margins.add_array(orders.margins[start:end][orders.has_margin[start:end]])
+        self.num_orders += int(complete.sum())
+
+        for item, count in orders.count_titles(start, end):
+            self.items[item] = self.items.get(item, 0) + count
+
+        for location, count in orders.count_locations(start, end):
+            self.locations[location] = self.locations.get(location, 0) + count
+
+        junk_rows = len(complete) - int(complete.sum())
+        if junk_rows:
+            print('Junk data in', junk_rows, 'rows of', self.name)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    merge                                                                   *
+    *                                                                                           *
+    * Description:      Adds the statistics of another report to this one. The start and end   *
+    *                   dates of this report are kept, the other report should only hold       *
+    *                   orders that are within them                                             *
+    *                                                                                           *
+    * Parameters:       EbayReport other    :   The report to add                               *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def merge(self, other):
+        if other.first_date != datetime.datetime(1, 1, 1):
+            if self.first_date == datetime.datetime(1, 1, 1): # Check if first_date is empty, if it is this report has no orders yet
+                self.first_date = other.first_date
+                self.last_date = other.last_date
+            else:
+                self.first_date = min(self.first_date, other.first_date)
+                self.last_date = max(self.last_date, other.last_date)
+
+        self.num_orders += other.num_orders
+        self.total_sales += other.total_sales
+        self.gross_profit += other.gross_profit
+        self.item_costs += other.item_costs
+        self.shipping_costs += other.shipping_costs
+        self.materials_costs += other.materials_costs
+
+        self.margins.merge(other.margins)
+
+        for item, count in other.items.items():
+            self.items[item] = self.items.get(item, 0) + count
+
+        for location, count in other.locations.items():
+            self.locations[location] = self.locations.get(location, 0) + count
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    __add__                                                                 *
+    *                                                                                           *
+    * Description:      Creates a new report with the statistics of both reports, covering the  *
+    *                   dates of both. It keeps the name of this report                         *
+    *                                                                                           *
+    * Parameters:       EbayReport other    :   The report to add                               *
+    *                                                                                           *
+    * Return Value:     EbayReport                                                              *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def __add__(self, other):
+        report = copy.copy(self)
+
+        report.start_date = min(self.start_date, other.start_date)
+        report.end_date = max(self.end_date, other.end_date)
+        report.margins = MarginStats()
+        report.margins.merge(self.margins)
+        report.items = dict(self.items)
+        report.locations = dict(self.locations)
+
+        report.merge(other)
+        return report
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    to_dict                                                                 *
+    *                                                                                           *
+    * Description:      returns the statistics of this report in a form that can be saved as    *
+    *                   json. load_dict reads them back in                                      *
+    *                                                                                           *
+    * Return Value:     dict                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def to_dict(self):
+        has_orders = self.first_date != datetime.datetime(1, 1, 1)
+
+        return {
+            'first_date': self.first_date.isoformat() if has_orders else None,
+            'last_date': self.last_date.isoformat() if has_orders else None,
+            'num_orders': self.num_orders,
+            'total_sales': self.total_sales,
+            'gross_profit': self.gross_profit,
+            'item_costs': self.item_costs,
+            'shipping_costs': self.shipping_costs,
+            'margins': [self.margins.count, self.margins.total, self.margins.min, self.margins.max, self.margins.mean, self.margins.m2],
+            'items': self.items,
+            'locations': [[state, city, count] for (state, city), count in self.locations.items()],
+        }
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    load_dict                                                               *
+    *                                                                                           *
+    * Description:      Replaces the statistics of this report with ones from to_dict           *
+    *                                                                                           *
+    * Parameters:       dict data   :   The statistics from to_dict                             *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def load_dict(self, data):
+        if data['first_date'] is not None:
+            self.first_date = datetime.date.fromisoformat(data['first_date'])
+            self.last_date = datetime.date.fromisoformat(data['last_date'])
+
+        self.num_orders = data['num_orders']
+        self.total_sales = data['total_sales']
+        self.gross_profit = data['gross_profit']
+        self.item_costs = data['item_costs']
+        self.shipping_costs = data['shipping_costs']
+
+        self.margins = MarginStats()
+        self.margins.count, self.margins.total, self.margins.min, self.margins.max, self.margins.mean, self.margins.m2 = data['margins']
+
+        self.items = dict(data['items'])
+        self.locations = {(state, city): count for state, city, count in data['locations']}
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_net_profit                                                          *
+    *                                                                                           *
+    * Description:      returns the gross profit minus costs                                    *
+    *                                                                                           *
+    * Return Value:     float                                                                   *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_net_profit(self):
+        return self.gross_profit - self.item_costs
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_profit_minus_costs                                                  *
+    *                                                                                           *
+    * Description:      returns the gross profit minus the materials costs of the report        *
+    *                                                                                           *
+    * Return Value:     float                                                                   *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_profit_minus_costs(self):
+        return self.gross_profit - self.materials_costs
+    
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_top_items                                                           *
+    *                                                                                           *
+    * Description:      returns a 2d array containing first the name of an item, followed by    *
+    *                   how many times that item was seen by visit_row                          *
+    *                                                                                           *
+    * Return Value:     [[str, float]]                                                          *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_top_items(self):
+        items_list = []
+        for key in self.items.keys():
+            items_list.append([key, self.items[key]])
+        
+        top_items = sorted(items_list, key=operator.itemgetter(1), reverse=True)
+
+        return top_items
     
-    # Merge all of the new reports into our main database
-    for new_df in new_reports_dfs:
-        df = df._append(new_df)
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_avg_margin                                                          *
+    *                                                                                           *
+    * Description:      returns the average profit margin(in percent) of all items seen by      *
+    *                   visit_row                                                               *
+    *                                                                                           *
+    * Return Value:     float                                                                   *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_avg_margin(self):
+        return self.margins.get_mean()
 
-    # Remove any accidental duplicate entries based on the order numbers
-    df.drop_duplicates(subset='Order number', keep='first', inplace=True)     
-   # TODO: Add eccept clauses
-    try:
-        # Remove data from the report we do not need
-        df.drop(df.loc[df['Type'] == 'Payout'].index, inplace=True)
-    except:
-        print("No rows to drop with 'Type': 'Payout'")
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_top_states                                                          *
+    *                                                                                           *
+    * Description:      returns the states the most orders were sent to                         *
+    *                                                                                           *
+    * Parameters:       int num_states  :   How many states to return, None for all of them     *
+    *                                                                                           *
+    * Return Value:     [[str, int]]    :   The state and its number of orders, most first      *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_top_states(self, num_states=None):
+        state_counts = {}
+        for (state, city), count in self.locations.items():
+            state_counts[state] = state_counts.get(state, 0) + count
 
-    try:
-        df.drop(df.loc[df['Type'] == 'Refund'].index, inplace=True)
-    except:
-        print("No rows to drop with 'Type': 'Refund'")
+        top_states = sorted([[state, count] for state, count in state_counts.items()], key=lambda entry: (-entry[1], entry[0]))
 
-    try:
-        df.drop(df.loc[df['Type'] == 'Shipping label'].index, inplace=True)
-    except:
-        print("No rows to drop with 'Type': 'Shipping label'")
+        return top_states[:num_states]
 
-    try:
-        df.drop(df.loc[df['Type'] == 'Other fee'].index, inplace=True)
-    except:
-        print("No rows to drop with 'Type': 'Other fee'")
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_top_cities                                                          *
+    *                                                                                           *
+    * Description:      returns the cities the most orders were sent to                         *
+    *                                                                                           *
+    * Parameters:       int num_cities  :   How many cities to return, None for all of them     *
+    *                                                                                           *
+    * Return Value:     [[str, str, int]]   :   The state, city and number of orders, most      *
+    *                                           first                                           *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_top_cities(self, num_cities=None):
+        top_cities = sorted([[state, city, count] for (state, city), count in self.locations.items()], key=lambda entry: (-entry[2], entry[0], entry[1]))
 
-    # Sort the database by date
-    df['Transaction creation date'] = pd.to_datetime(df['Transaction creation date'], format='mixed')
-    df.sort_values(by='Transaction creation date', inplace=True) 
+        return top_cities[:num_cities]
 
-    df.to_csv(database_dir + database_filename, mode='w', index=False)
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    print_report                                                            *
+    *                                                                                           *
+    * Description:      prints to the console a formatted version of the statistcs computed in  *
+    *                   this report                                                             *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def print_report(self):
+        print(self.name)
+        print(self.start_date, '-', self.end_date)
+        print('=================================================================')
+        print('First and last days to receive orders:', self.first_date, '-', self.last_date) # type : ignore
+        print('Number of orders:', self.num_orders)
+        print('Final value sales:', round(self.total_sales, 2))
+        print('Gross Profit: ', round(self.gross_profit, 2))
+        print('Estimated Per Item Costs:', round(self.item_costs, 2))
+        print('Net profit:', round(self.gross_profit - self.item_costs, 2))
+        print('Materials costs:', round(self.materials_costs, 2))
+        print('Profit minus all costs:', round(self.get_profit_minus_costs(), 2))
+        print('Average profit margin:', str(round(self.get_avg_margin() * 100)) + '%')
+        for state, count in self.get_top_states(1):
+            print('Top state:', state, '-', count)
+        for state, city, count in self.get_top_cities(1):
+            print('Top city:', city + ', ' + state, '-', count)
+        print('Top 5 items:')
+        for i, entry in enumerate(self.get_top_items()):
+            print('\t', entry[0], '-', entry[1])
+            if i >= 4:
+                break
 
-    return df
-     
 '''
 * ***************************************************************************************** *
 *                                                                                           *
-* Class name:       EbayReport                                                              *
+* Class name:       StatsGen                                                                *
 *                                                                                           *
-* Description:      Contains all statistics about ebay transactions over a given time period*
-*                   it memorizes all rows that are passed into it's visit_row function. Any *
-*                   rows not within the start_date and end_date will be ignored             *
+* Description:      Orchestrates the generation of commonly needed report timeframes        *
+*                   including: last week, last month, last quarter, last year, year to date *
+*                   all time, and monthly reports for every month contained within the      *
+*                   database                                                                *
 *                                                                                           *
-* Parameters:      [str] header             : The header of the csv database                *
-*                  str   name               : An identifier for when this report is printed *
-*                  ItemManager item_man     : The class responsible for keeping track of    *
-*                                             item costs and if an item should be counted   *
-*                  datetime date start_date : The first date(inclusive) that should be      *
-*                                             included in the report                        *
-*                  datetime date end_date   : The last date(inclusive) that should be       *
-*                                             included in the report                        *
+* Parameters:      [str]        header   : The header of the csv database                   *
+*                  [[str]]      table    : The entire dataset to run the reports on         *
+*                  ItemManager  item_man : The class responsible for keeping track of       *
+*                                          item costs and if an item should be counted      *
+*                  RunContext   run_context : The date the report date ranges are relative  *
+*                                          to, defaults to dateParser.get_run_context       *
+*                  str          costs_dir : The directory to read costs.csv from            *
 *                                                                                           *
 * ***************************************************************************************** *
 '''
-class EbayReport:
-    def __init__(self, header, item_man, name, start_date, end_date):
-        self.item_man = item_man
+class StatsGen:
+    def __init__(self, header, table, item_man, run_context=None, costs_dir='./'):
+        self.run_context = run_context if run_context is not None else dateParser.get_run_context()
 
-        self.name = name
+        # If you have other sales not on ebay you would like to be added to the full profit calculation
+        self.sales_offset = 0
+        self.item_man = item_man
         
-        # Indexes of the needed data in a row
-        self.date_i = header.index('Transaction creation date')
-        self.subtotal_i = header.index('Item subtotal')
-        self.item_name_i = header.index('Item title')
-        self.shipping_i = header.index('Shipping and handling')
-        self.final_fee_i = header.index('Final Value Fee - fixed')
-        self.value_fee_i = header.index('Final Value Fee - variable')
+        self.header = header
+        self.table = table
+
+        # The typed copy of self.table, see run_reports
+        self.orders = None
+
+        # Where the reports of closed months are saved between runs, see set_report_store
+        self.report_store_path = None
+
+        # The costs csv added up by day, see set_daily_costs
+        self.costs_dir = costs_dir
+        self.daily_costs = None
+
+        self.full_report = EbayReport(header, self.item_man, 'All time', 'begin', 'end', self.run_context)
         
-        # Sumation variables
-        self.num_orders = 0
-        self.total_sales = 0.0
-        self.gross_profit = 0.0
-        self.item_costs = 0.0 
-        self.shipping_costs = 0.0
+        # Where all monthly reports will be stored so you can iterate on them. They are created
+        # by run_reports once the range of dates in the dataset is known
+        self.monthly_reports = []
+
+        # Quarterly and yearly reports, merged together from the monthly reports
+        self.quarterly_reports = []
+        self.yearly_reports = []
         
-        # Variables that will get the profit and cost of each order
-        # added to it. This will allow the calculation of average 
-        # profit margin
-        self.order_profits = []
-        self.order_costs = []
+        # The range of dates contained within the whole dataset
+        self.first_date = self.full_report.first_date
+        self.last_date = self.full_report.last_date
         
-        if start_date == 'begin':
-            self.start_date = datetime.date(1900, 1, 1)
-        else:
-            self.start_date = start_date 
+        # Find the end dates for each relative time range
+        today = self.run_context.today
+        date_week = today - datetime.timedelta(7)
+        date_month = today - datetime.timedelta(31)
+        date_quarter = today - datetime.timedelta(90)
+        date_year = today - datetime.timedelta(365)
 
-        if end_date == 'end':
-            self.end_date = datetime.datetime.now().date()
-        else:
-            self.end_date = end_date 
-        
-        # TODO May have added bug here
-        self.first_date = datetime.datetime(1, 1, 1) 
-        self.last_date = datetime.datetime(1, 1, 1) 
+        self.week_report = EbayReport(self.header, self.item_man, 'Last 7 days', date_week, today, self.run_context)
+        self.month_report = EbayReport(self.header, self.item_man, 'Last 31 days', date_month, today, self.run_context)
+        self.quarter_report = EbayReport(self.header, self.item_man, 'Last 90 days', date_quarter, today, self.run_context)
+        self.year_report = EbayReport(self.header, self.item_man, 'Last 365 days', date_year, today, self.run_context)
         
-        # A dictionary containing each seen item and how many times
-        # it was seen
-        self.items = {}
+        self.ytd_report = EbayReport(self.header, self.item_man, 'Year to date', datetime.date(today.year, 1, 1), today, self.run_context)
+
+        # All relative reports in a list so they can be iterated on
+        self.relative_reports = [self.week_report, self.month_report, self.quarter_report, self.year_report, self.ytd_report]
+
+        # Flips to true once run_reports has gone through the table
+        self.reports_run = False
 
     '''
     * ***************************************************************************************** *
     *                                                                                           *
-    * Function name:    visit_row                                                               *
+    * Function name:    run_reports                                                             *
     *                                                                                           *
-    * Description:      Memorizes the data in a row into the class and adds it to the statistics*
-    *                   that are computed                                                       *
+    * Description:      Ingests all data in self.table into the monthly reports and the         *
+    *                   relative reports in a single pass. The rows are loaded into             *
+    *                   self.orders, an OrderStore, and the cost of each order is only looked   *
+    *                   up once. Each order is only handed to the report for its month and the  *
+    *                   relative reports, the full report is merged from the monthly ones. If a *
+    *                   report store is set, months saved in it are not computed again. Orders  *
+    *                   dated after the run date are left out, as they would not exist yet      *
     *                                                                                           *
-    * Parameters:       [str]  row  :   A row of data from the ebay CSV files                   *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def run_reports(self):
+        if self.reports_run:
+            return
+
+        # Every value gets converted once here, then the reports read from the typed columns
+        self.orders = OrderStore(self.header, self.table)
+        orders = self.orders
+
+        for item_name in orders.titles:
+            self.item_man.visit_item(item_name)
+
+        # Monthly reports keyed by (year, month)
+        month_buckets = {}
+
+        month_fingerprints = {}
+        stored_months = {}
+        if self.report_store_path is not None:
+            month_fingerprints = get_month_fingerprints(orders.dates, [orders.titles[i] for i in orders.item_ids], orders.subtotals, 
+                                                        orders.shipping, orders.final_fees, orders.value_fees, 
+                                                        ['\x1f'.join(orders.locations[i]) for i in orders.location_ids])
+            stored_months = self.load_stored_months(month_fingerprints)
+            month_buckets.update(stored_months)
+
+        # Orders in a stored month before this are not needed by any report
+        relative_start = min(report.start_date for report in self.relative_reports).toordinal()
+        run_date = self.run_context.today.toordinal()
+
+        for i in range(len(orders)):
+            if orders.dates[i] > run_date:
+                continue
+
+            item_date = datetime.date.fromordinal(orders.dates[i])
+            key = (item_date.year, item_date.month)
+            if key in stored_months and orders.dates[i] < relative_start:
+                continue
+
+            item_name = orders.titles[orders.item_ids[i]]
+            item_cost = self.item_man.get_cost(item_name, item_date)
+
+            values = (item_date, item_name, orders.subtotals[i], orders.shipping[i], orders.final_fees[i], orders.value_fees[i], item_cost,
+                      orders.locations[orders.location_ids[i]])
+
+            if key not in stored_months:
+                if key not in month_buckets:
+                    month_buckets[key] = self.create_monthly_report(item_date.year, item_date.month)
+
+                month_buckets[key].add_order(*values)
+
+            for report in self.relative_reports:
+                report.add_order(*values)
+
+        self.set_monthly_reports(month_buckets)
+        if self.report_store_path is not None:
+            self.save_stored_months(month_fingerprints)
+
+        self.reports_run = True
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    set_report_store                                                        *
+    *                                                                                           *
+    * Description:      Sets a file to save the reports of closed months to. Later runs take    *
+    *                   a month's report from the file as long as the orders of that month and  *
+    *                   the costs during it are the same as when it was saved. The current      *
+    *                   month is always computed                                                *
+    *                                                                                           *
+    * Parameters:       str path    :   Path of the store, None to not use one                  *
     *                                                                                           *
     * Return Value:     none                                                                    *
     *                                                                                           *
     * ***************************************************************************************** *
     '''
-    def visit_row(self, row):
-        self.item_man.update_valid_items()
-        item_cost = item_mngr.get_cost(row[self.item_name_i], row[self.date_i])
-        item_date = datetime.datetime.strptime(row[self.date_i], '%Y-%m-%d').date()
+    def set_report_store(self, path):
+        self.report_store_path = path
 
-        # Statistics should only be calculated for a row if the item exists in the item manager,
-        # and the date for the order is within the range start_date to end_date inclusive
-        if (item_cost != 'ignore' and item_cost != '-1' and item_cost != -1) and item_date >= self.start_date and item_date <= self.end_date:
-            if self.first_date == datetime.datetime(1, 1, 1): # Check if first_date is empty, if it is this is the first row we've seen
-                self.first_date = item_date
-                
-            self.last_date = item_date
-            
-            # the type conversion from string to float here can fail if there is not data in the cell,
-            # ocassionally ebay csvs don't have data in these rows for some reason.
-            try:
-                order_pofit = float(row[self.subtotal_i]) + float(row[self.final_fee_i]) + float(row[self.value_fee_i]) 
-                self.total_sales += float(row[self.subtotal_i])
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    load_stored_months                                                      *
+    *                                                                                           *
+    * Description:      Loads the reports of the closed months that are still valid from the    *
+    *                   report store                                                            *
+    *                                                                                           *
+    * Parameters:       {(int, int): str} month_fingerprints    :   The hash of the orders in   *
+    *                                                               each month, from            *
+    *                                                               get_month_fingerprints      *
+    *                                                                                           *
+    * Return Value:     {(int, int): EbayReport}    :   Reports keyed by (year, month)          *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def load_stored_months(self, month_fingerprints):
+        store = load_report_store(self.report_store_path)
+        if store.get('version') != REPORT_STORE_VERSION:
+            return {}
 
-                self.shipping_costs += float(row[self.shipping_i])
+        # Only the months where a cost changed since the reports were saved need to be computed again
+        if store['tables'] == self.item_man.get_tables_fingerprint():
+            affected_months = set()
+        elif store.get('lookup_table') is not None:
+            affected_months = self.item_man.get_affected_months(store['lookup_table'], store['alias_table'])
+        else:
+            return {}
 
-                self.gross_profit += order_pofit
-                self.order_profits.append(order_pofit)
+        today = self.run_context.today
 
-                self.item_costs += float(item_cost)
-                self.order_costs.append(float(item_cost))
+        stored_months = {}
+        for key, fingerprint in month_fingerprints.items():
+            stored = store['months'].get('%04d-%02d' % key)
+            if key >= (today.year, today.month) or key in affected_months or stored is None or stored['rows'] != fingerprint:
+                continue
 
-                self.num_orders += 1
-                
-                # If the item has been seen before, increment the count of it,
-                # otherwise create the entry
-                if row[self.item_name_i] in self.items:
-                    self.items[row[self.item_name_i]] += 1
-                else:
-                    self.items[row[self.item_name_i]] = 1
+            stored_months[key] = self.create_monthly_report(*key)
+            stored_months[key].load_dict(stored['report'])
+
+        return stored_months
 
-            except ValueError:
-                print('Junk data, name=', row[self.item_name_i], ' - date=', row[self.date_i])
-    
     '''
     * ***************************************************************************************** *
     *                                                                                           *
-    * Function name:    get_net_profit                                                          *
+    * Function name:    save_stored_months                                                      *
     *                                                                                           *
-    * Description:      returns the gross profit minus costs                                    *
+    * Description:      Saves the reports of every closed month with orders to the report store *
     *                                                                                           *
-    * Return Value:     float                                                                   *
+    * Parameters:       {(int, int): str} month_fingerprints    :   The hash of the orders in   *
+    *                                                               each month, from            *
+    *                                                               get_month_fingerprints      *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
     *                                                                                           *
     * ***************************************************************************************** *
     '''
-    def get_net_profit(self):
-        return self.gross_profit - self.item_costs
-    
+    def save_stored_months(self, month_fingerprints):
+        today = self.run_context.today
+
+        store = {
+            'version': REPORT_STORE_VERSION,
+            'tables': self.item_man.get_tables_fingerprint(),
+            'lookup_table': self.item_man.lookup_table,
+            'alias_table': self.item_man.alias_table,
+            'months': {},
+        }
+        for report in self.monthly_reports:
+            key = (report.start_date.year, report.start_date.month)
+            if key in month_fingerprints and key < (today.year, today.month):
+                store['months']['%04d-%02d' % key] = {'rows': month_fingerprints[key], 'report': report.to_dict()}
+
+        save_report_store(self.report_store_path, store)
+
     '''
     * ***************************************************************************************** *
     *                                                                                           *
-    * Function name:    get_top_items                                                           *
+    * Function name:    set_monthly_reports                                                     *
     *                                                                                           *
-    * Description:      returns a 2d array containing first the name of an item, followed by    *
-    *                   how many times that item was seen by visit_row                          *
+    * Description:      Merges the monthly reports into the full report, then fills             *
+    *                   self.monthly_reports with a report for every month from the first to    *
+    *                   the last order, so that months without any orders still get a report.   *
+    *                   The quarterly and yearly reports are then merged from the months        *
     *                                                                                           *
-    * Return Value:     [[str, float]]                                                          *
+    * Parameters:       {(int, int): EbayReport} month_buckets  :   Reports keyed by (year,     *
+    *                                                               month)                      *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
     *                                                                                           *
     * ***************************************************************************************** *
     '''
-    def get_top_items(self):
-        items_list = []
-        for key in self.items.keys():
-            items_list.append([key, self.items[key]])
+    def set_monthly_reports(self, month_buckets):
+        for key in sorted(month_buckets):
+            self.full_report.merge(month_buckets[key])
+
+        self.first_date = self.full_report.first_date
+        self.last_date = self.full_report.last_date
         
-        top_items = sorted(items_list, key=operator.itemgetter(1), reverse=True)
+        self.monthly_reports = []
+        if self.full_report.num_orders > 0:
+            year, month = self.first_date.year, self.first_date.month
+            while (year, month) <= (self.last_date.year, self.last_date.month):
+                if (year, month) in month_buckets:
+                    self.monthly_reports.append(month_buckets[(year, month)])
+                else:
+                    self.monthly_reports.append(self.create_monthly_report(year, month))
+
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        self.quarterly_reports = self.rollup_monthly_reports(lambda date: (date.year, (date.month - 1) // 3), 
+                                                             lambda date: 'Q' + str((date.month - 1) // 3 + 1) + ' ' + str(date.year))
+        self.yearly_reports = self.rollup_monthly_reports(lambda date: date.year, lambda date: str(date.year))
+
+        self.set_materials_costs()
 
-        return top_items
-    
     '''
     * ***************************************************************************************** *
     *                                                                                           *
-    * Function name:    get_avg_margin                                                          *
+    * Function name:    set_daily_costs                                                         *
     *                                                                                           *
-    * Description:      returns the average profit margin(in percent) of all items seen by      *
-    *                   visit_row                                                               *
+    * Description:      Sets the costs the reports take their materials costs from              *
+    *                                                                                           *
+    * Parameters:       costs.DailyCosts daily_costs    :   The costs, None to load costs.csv   *
+    *                                                       from self.costs_dir                 *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def set_daily_costs(self, daily_costs):
+        self.daily_costs = daily_costs
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    set_materials_costs                                                     *
+    *                                                                                           *
+    * Description:      Sets the materials costs of the monthly, quarterly, yearly and relative *
+    *                   reports to the costs during their dates. The full report gets every     *
+    *                   cost in the csv, including ones dated after today or with a date that   *
+    *                   can not be read, the same as the whole ledger. costs.csv is only read   *
+    *                   from self.costs_dir the first time, unless set_daily_costs was called   *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def set_materials_costs(self):
+        if self.daily_costs is None:
+            self.daily_costs = costs.DailyCosts(costs.CostsLedger(self.costs_dir))
+
+        self.full_report.materials_costs = self.daily_costs.total
+
+        reports = self.monthly_reports + self.quarterly_reports + self.yearly_reports + self.relative_reports
+        for report in reports:
+            report.materials_costs = self.daily_costs.get_total(report.start_date, report.end_date)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    rollup_monthly_reports                                                  *
+    *                                                                                           *
+    * Description:      Merges the monthly reports into reports for longer periods, such as     *
+    *                   quarters or years. Months are grouped by the key of their start date    *
     *                                                                                           *
-    * Return Value:     float                                                                   *
+    * Parameters:       function period_key     :   Takes the start date of a month and returns *
+    *                                               the period it belongs to                    *
+    *                   function period_name    :   Takes the start date of a month and returns *
+    *                                               the name of its period's report             *
+    *                                                                                           *
+    * Return Value:     [EbayReport]    :   A report for each period, in date order             *
     *                                                                                           *
     * ***************************************************************************************** *
     '''
-    def get_avg_margin(self):
-        sum = 0
-        for i, profit in enumerate(self.order_profits):
-            sum += (profit - self.order_costs[i]) / self.order_costs[i]
+    def rollup_monthly_reports(self, period_key, period_name):
+        rollups = {}
+        for report in self.monthly_reports:
+            key = period_key(report.start_date)
+            if key not in rollups:
+                rollups[key] = EbayReport(self.header, self.item_man, period_name(report.start_date), report.start_date, report.end_date, self.run_context)
 
-        try:
-            return sum / len(self.order_profits)
-        except:
-            return 0.0
+            rollups[key] = rollups[key] + report
+
+        return list(rollups.values())
 
     '''
     * ***************************************************************************************** *
     *                                                                                           *
-    * Function name:    print_report                                                            *
+    * Function name:    create_monthly_report                                                   *
     *                                                                                           *
-    * Description:      prints to the console a formatted version of the statistcs computed in  *
-    *                   this report                                                             *
+    * Description:      Creates an empty report covering every day of a month                   *
     *                                                                                           *
-    * Return Value:     none                                                                    *
+    * Parameters:       int year    :   The year of the month                                   *
+    *                   int month   :   The month number, 1-12                                  *
+    *                                                                                           *
+    * Return Value:     EbayReport                                                              *
     *                                                                                           *
     * ***************************************************************************************** *
     '''
-    def print_report(self):
-        print(self.name)
-        print(self.start_date, '-', self.end_date)
-        print('=================================================================')
-        print('First and last days to receive orders:', self.first_date, '-', self.last_date) # type : ignore
-        print('Number of orders:', self.num_orders)
-        print('Final value sales:', round(self.total_sales, 2))
-        print('Gross Profit: ', round(self.gross_profit, 2))
-        print('Estimated Per Item Costs:', round(self.item_costs, 2))
-        print('Net profit:', round(self.gross_profit - self.item_costs, 2))
-        print('Average profit margin:', str(round(self.get_avg_margin() * 100)) + '%')
-        print('Top 5 items:')
-        for i, entry in enumerate(self.get_top_items()):
-            print('\t', entry[0], '-', entry[1])
-            if i >= 4:
-                break
-
-'''
-* ***************************************************************************************** *
-*                                                                                           *
-* Class name:       StatsGen                                                                *
-*                                                                                           *
-* Description:      Orchestrates the generation of commonly needed report timeframes        *
-*                   including: last week, last month, last quarter, last year, year to date *
-*                   all time, and monthly reports for every month contained within the      *
-*                   database                                                                *
-*                                                                                           *
-* Parameters:      [str]        header   : The header of the csv database                   *
-*                  [[str]]      table    : The entire dataset to run the reports on         *
-*                  ItemManager  item_man : The class responsible for keeping track of       *
-*                                          item costs and if an item should be counted      *
-*                                                                                           *
-* ***************************************************************************************** *
-'''
-class StatsGen:
-    def __init__(self, header, table, item_man):
-        # If you have other sales not on ebay you would like to be added to the full profit calculation
-        self.sales_offset = 0
-        self.item_man = item_man
-        
-        self.header = header
-        self.table = table
-
-        self.full_report = EbayReport(header, self.item_man, 'All time', 'begin', 'end')
-        
-        # Ingest the entire report 
-        for row in table:
-            self.full_report.visit_row(row) 
-        
-        # Where all monthly reports will be stored so you can iterate on them
-        self.monthly_reports = []
-        
-        # The range of dates contained within the whole dataset
-        self.first_date = self.full_report.first_date
-        self.last_date = self.full_report.last_date
-        
-        # Iterate through all months contained in the dataset, find the first and last
-        # days, then create reports for those months
-        tempdate = self.first_date 
-        while tempdate < self.last_date: # pyright : ignore
-            monthrange = calendar.monthrange(tempdate.year, tempdate.month) 
-
-            start_date = datetime.datetime(tempdate.year, tempdate.month, 1).date()
-            end_date = start_date + datetime.timedelta(monthrange[1] - 1)
-            
-            name = calendar.month_name[start_date.month] + ' ' + str(start_date.year)
-            self.monthly_reports.append(EbayReport(self.header, self.item_man, name, start_date, end_date))
+    def create_monthly_report(self, year, month):
+        monthrange = calendar.monthrange(year, month) 
 
-            tempdate = end_date + datetime.timedelta(1) 
-        
-        # Find the end dates for each relative time range
-        date_week = datetime.datetime.now().date() - datetime.timedelta(7)
-        date_month = datetime.datetime.now().date() - datetime.timedelta(31)
-        date_quarter = datetime.datetime.now().date() - datetime.timedelta(90)
-        date_year = datetime.datetime.now().date() - datetime.timedelta(365)
-
-        self.week_report = EbayReport(self.header, self.item_man, 'Last 7 days', date_week, datetime.datetime.now().date())
-        self.month_report = EbayReport(self.header, self.item_man, 'Last 31 days', date_month, datetime.datetime.now().date())
-        self.quarter_report = EbayReport(self.header, self.item_man, 'Last 90 days', date_quarter, datetime.datetime.now().date())
-        self.year_report = EbayReport(self.header, self.item_man, 'Last 365 days', date_year, datetime.datetime.now().date())
+        start_date = datetime.datetime(year, month, 1).date()
+        end_date = start_date + datetime.timedelta(monthrange[1] - 1)
         
-        self.ytd_report = EbayReport(self.header, self.item_man, 'Year to date', datetime.datetime(datetime.datetime.now().year, 1, 1).date(), datetime.datetime.now().date())
+        name = calendar.month_name[start_date.month] + ' ' + str(start_date.year)
 
-        # All relative reports in a list so they can be iterated on
-        self.relative_reports = [self.week_report, self.month_report, self.quarter_report, self.year_report, self.ytd_report]
+        return EbayReport(self.header, self.item_man, name, start_date, end_date, self.run_context)
 
     '''
     * ***************************************************************************************** *
     *                                                                                           *
     * Function name:    run_monthly_reports                                                     *
     *                                                                                           *
-    * Description:      Ingetsts all data in self.table into all of the monthly reports         *
+    * Description:      Ingetsts all data in self.table into all of the monthly reports, see    *
+    *                   run_reports                                                             *
     *                                                                                           *
     * Return Value:     none                                                                    *
     *                                                                                           *
     * ***************************************************************************************** *
     '''
     def run_monthly_reports(self):
-        for row in self.table:
-            for report in self.monthly_reports:
-                report.visit_row(row)
+        self.run_reports()
 
     '''
     * ***************************************************************************************** *
@@ -461,24 +2168,58 @@ class StatsGen:
                     print('\tFinal Value Sales:', str(round(get_change(report.total_sales, prev.total_sales),2)) + '%')
                     print('\tGross Profit:', str(round(get_change(report.gross_profit, prev.gross_profit), 2)) + '%')
                     print('\tNet profit:', str(round(get_change(report.get_net_profit(), prev.get_net_profit()),2)) + '%')
+                    print('\tProfit minus all costs:', str(round(get_change(report.get_profit_minus_costs(), prev.get_profit_minus_costs()),2)) + '%')
                 print()
     
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    print_quarterly_reports                                                 *
+    *                                                                                           *
+    * Description:      Prints all the statistics contained within the quarterly reports        *
+    *                                                                                           *
+    * Parameters:       int year    :   The year for which to print reports on                  *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def print_quarterly_reports(self, year):
+        for report in self.quarterly_reports:
+            if (report.end_date.year == year):
+                report.print_report()
+                print()
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    print_yearly_reports                                                    *
+    *                                                                                           *
+    * Description:      Prints all the statistics contained within the yearly reports           *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def print_yearly_reports(self):
+        for report in self.yearly_reports:
+            report.print_report()
+            print()
+
     '''
     * ***************************************************************************************** *
     *                                                                                           *
     * Function name:    run_relative_reports                                                    *
     *                                                                                           *
-    * Description:      Ingetsts all data in self.table into all of the relative reports        *
+    * Description:      Ingetsts all data in self.table into all of the relative reports, see   *
+    *                   run_reports                                                             *
     *                                                                                           *
     * Return Value:     none                                                                    *
     *                                                                                           *
     * ***************************************************************************************** *
     '''
     def run_relative_reports(self):
-        for row in self.table:
-            self.item_man.visit_row(row)
-            for report in self.relative_reports:
-                report.visit_row(row)
+        self.run_reports()
 
     '''
     * ***************************************************************************************** *
@@ -513,9 +2254,6 @@ class StatsGen:
             report.print_report()
             print()
 
-        costs_header, costs_dataset = costs.get_costs_dataset()
-        sum_costs = costs.sum_costs(header=costs_header, dataset=costs_dataset)
-
         print('Summary of all orders')
         print(self.full_report.first_date, '-', self.full_report.last_date) # type : ignore
         print('=================================================================')
@@ -524,8 +2262,8 @@ class StatsGen:
         print('Estimated Per Item Costs:', self.full_report.item_costs)
         print('Estimated net profit:', self.full_report.gross_profit - self.full_report.item_costs)
         print()
-        print('Materials Costs:', sum_costs)
-        print('Total profit minus all costs: ', self.full_report.gross_profit + self.sales_offset - sum_costs)
+        print('Materials Costs:', self.full_report.materials_costs)
+        print('Total profit minus all costs: ', self.full_report.get_profit_minus_costs() + self.sales_offset)
         print()
 
         print('Top Items:')
@@ -536,6 +2274,339 @@ class StatsGen:
     def dump_reports(self, path, precision):
         pass
 
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    attach_item_costs                                                       *
+*                                                                                           *
+* Description:      Looks up the cost of every order in a dataframe at once with            *
+*                   ItemManager.get_costs                                                   *
+*                                                                                           *
+* Parameters:       pandas dataframe data_frame :   The ebay database from                  *
+*                                                   update_csv_database                     *
+*                   ItemManager item_man        :   The class responsible for keeping track *
+*                                                   of item costs                           *
+*                                                                                           *
+* Return Value:     pandas dataframe    :   A copy of the columns of data_frame the reports *
+*                                           use with the money columns as floats, plus an   *
+*                                           'Order date' column and an 'Item cost' column   *
+*                                           that is NaN for items that should not be        *
+*                                           counted                                         *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def attach_item_costs(data_frame, item_man):
+    columns = [col for col in REPORT_COLUMNS if col in data_frame.columns]
+    orders = data_frame[columns].reset_index(drop=True)
+    orders['Order date'] = pd.to_datetime(orders['Transaction creation date'], format='mixed').dt.normalize().astype('datetime64[ns]')
+
+    for col in ['Item subtotal', 'Shipping and handling', 'Final Value Fee - fixed', 'Final Value Fee - variable']:
+        orders[col] = pd.to_numeric(orders[col], errors='coerce')
+
+    orders['Item cost'], _ = item_man.get_costs(orders['Item title'].fillna(''), orders['Order date'])
+
+    return orders
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Class name:       FrameOrders                                                             *
+*                                                                                           *
+* Description:      The columns of a dataframe from attach_item_costs that the reports need,*
+*                   as numpy arrays sorted by date. The orders of any range of dates are a  *
+*                   slice of the arrays, found with get_bounds, so every report reads its   *
+*                   orders without copying the frame. Orders without an item cost are left  *
+*                   out                                                                     *
+*                                                                                           *
+* Parameters:      pandas dataframe orders : Orders with costs from attach_item_costs       *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+class FrameOrders:
+    def __init__(self, orders):
+        # The rows with a cost, sorted by date. A stable sort keeps the orders of each day in the order
+        # they are in the database
+        has_cost = np.flatnonzero(orders['Item cost'].notna().to_numpy())
+        days = orders['Order date'].to_numpy(dtype='datetime64[D]')[has_cost]
+        by_date = np.argsort(days, kind='stable')
+        order = has_cost[by_date]
+        self.days = days[by_date]
+
+        def get_column(col):
+            return orders[col].to_numpy(dtype=float)[order]
+
+        self.subtotals = get_column('Item subtotal')
+        self.shipping = get_column('Shipping and handling')
+        self.item_costs = get_column('Item cost')
+        self.profits = self.subtotals + get_column('Final Value Fee - fixed') + get_column('Final Value Fee - variable')
+
+        self.has_profit = ~np.isnan(self.profits)
+        self.complete = self.has_profit & ~np.isnan(self.shipping)
+
+        # The margin of an item that costs nothing has no meaning
+        self.has_margin = self.complete & (self.item_costs != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.margins = (self.profits - self.item_costs) / self.item_costs
+
+        # Each order holds the index of its title in self.titles, -1 for a missing title
+        self.title_ids, self.titles = pd.factorize(orders['Item title'].to_numpy(dtype=object)[order])
+
+        # Each order holds the index of the buyer's (state, city) in self.locations
+        location_ids, self.locations = factorize_locations(orders)
+        self.location_ids = location_ids[order]
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_bounds                                                              *
+    *                                                                                           *
+    * Description:      Finds the slice of the orders between two dates                         *
+    *                                                                                           *
+    * Parameters:       datetime date start_date    :   The first date(inclusive)               *
+    *                   datetime date end_date      :   The last date(inclusive)                *
+    *                                                                                           *
+    * Return Value:     (int, int)  :   The start and end of the slice                          *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_bounds(self, start_date, end_date):
+        start = int(np.searchsorted(self.days, np.datetime64(start_date, 'D'), side='left'))
+        end = int(np.searchsorted(self.days, np.datetime64(end_date, 'D'), side='right'))
+
+        return start, max(start, end)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    get_months                                                              *
+    *                                                                                           *
+    * Description:      returns every month that has orders                                     *
+    *                                                                                           *
+    * Return Value:     [(int, int)]    :   (year, month) of each month, in date order          *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def get_months(self):
+        months = np.unique(self.days.astype('datetime64[M]').astype(np.int64))
+
+        return [(int(month) // 12 + 1970, int(month) % 12 + 1) for month in months]
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    count_titles                                                            *
+    *                                                                                           *
+    * Description:      Counts the complete orders of each item in a slice of the orders        *
+    *                                                                                           *
+    * Parameters:       int start   :   Start of the slice, from get_bounds                     *
+    *                   int end     :   End of the slice, from get_bounds                       *
+    *                                                                                           *
+    * Return Value:     [(str, int)]    :   Each item and its count, in the order each item     *
+    *                                       first shows up in the slice                         *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def count_titles(self, start, end):
+        title_ids = self.title_ids[start:end][self.complete[start:end]]
+
+        return count_codes(title_ids[title_ids >= 0], self.titles)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    count_locations                                                         *
+    *                                                                                           *
+    * Description:      Counts the complete orders sent to each city in a slice of the orders   *
+    *                                                                                           *
+    * Parameters:       int start   :   Start of the slice, from get_bounds                     *
+    *                   int end     :   End of the slice, from get_bounds                       *
+    *                                                                                           *
+    * Return Value:     [((str, str), int)] :   Each (state, city) and its count, in the order  *
+    *                                           each one first shows up in the slice            *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def count_locations(self, start, end):
+        return count_codes(self.location_ids[start:end][self.complete[start:end]], self.locations)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Function name:    count_codes                                                             *
+*                                                                                           *
+* Description:      Counts how many times each code shows up with np.bincount               *
+*                                                                                           *
+* Parameters:       numpy array codes   :   The codes to count, none of them negative       *
+*                   list        values  :   The value each code stands for                  *
+*                                                                                           *
+* Return Value:     [(value, int)]  :   Each value that shows up and its count, in the      *
+*                                       order each one first shows up in codes              *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+def count_codes(codes, values):
+    counts = np.bincount(codes, minlength=len(values))
+    ids, first = np.unique(codes, return_index=True)
+
+    return [(values[code], int(counts[code])) for code in ids[np.argsort(first)]]
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Class name:       FrameStatsGen                                                           *
+*                                                                                           *
+* Description:      Generates the same reports as StatsGen, but works on the pandas         *
+*                   dataframe returned by update_csv_database. Costs are looked up for all  *
+*                   orders at once, and every report adds its orders with EbayReport        *
+*                   add_frame instead of visiting the rows one at a time                    *
+*                                                                                           *
+* Parameters:      pandas dataframe data_frame : The ebay database from update_csv_database *
+*                  ItemManager      item_man   : The class responsible for keeping track of *
+*                                                item costs and if an item should be counted*
+*                  RunContext       run_context: See StatsGen                               *
+*                  str              costs_dir  : See StatsGen                               *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+class FrameStatsGen(StatsGen):
+    def __init__(self, data_frame, item_man, run_context=None, costs_dir='./'):
+        super().__init__(list(data_frame.columns), data_frame, item_man, run_context, costs_dir)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    run_reports                                                             *
+    *                                                                                           *
+    * Description:      Ingests the whole dataframe into the full report, the monthly reports   *
+    *                   and the relative reports. If a report store is set, months saved in it  *
+    *                   are not computed again                                                  *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def run_reports(self):
+        if self.reports_run:
+            return
+
+        month_buckets = {}
+        orders = self.table
+
+        month_fingerprints = {}
+        stored_months = {}
+        if self.report_store_path is not None:
+            for item in orders['Item title'].fillna('').unique():
+                self.item_man.visit_item(item)
+
+            dates = pd.to_datetime(orders['Transaction creation date'], format='mixed').dt.normalize()
+            ordinals = dates.to_numpy(dtype='datetime64[D]').astype(np.int64) + 719163 # The ordinal of 1970-01-01
+
+            money = [pd.to_numeric(orders[col], errors='coerce').to_numpy(dtype=float) 
+                     for col in ['Item subtotal', 'Shipping and handling', 'Final Value Fee - fixed', 'Final Value Fee - variable']]
+            locations = [orders[col].astype(object).fillna('').astype(str) if col in orders.columns else pd.Series('', index=orders.index) 
+                         for col in ['Buyer State', 'Buyer City']]
+            month_fingerprints = get_month_fingerprints(ordinals, orders['Item title'].fillna('').astype(str).to_numpy(dtype=object), *money, 
+                                                        (locations[0] + '\x1f' + locations[1]).to_numpy(dtype=object))
+            stored_months = self.load_stored_months(month_fingerprints)
+            month_buckets.update(stored_months)
+
+            # Orders in a stored month are only needed by the relative reports
+            relative_start = min(report.start_date for report in self.relative_reports)
+            stored_periods = [pd.Period(year=year, month=month, freq='M') for year, month in stored_months]
+            orders = orders[~dates.dt.to_period('M').isin(stored_periods).to_numpy() | (dates >= pd.Timestamp(relative_start)).to_numpy()]
+
+        self.add_orders(orders, month_buckets, stored_months)
+
+        self.set_monthly_reports(month_buckets)
+        if self.report_store_path is not None:
+            self.save_stored_months(month_fingerprints)
+
+        self.reports_run = True
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    add_orders                                                              *
+    *                                                                                           *
+    * Description:      Looks up the costs of the orders in a dataframe, then adds them to the  *
+    *                   monthly reports and the relative reports. Orders dated after the run    *
+    *                   date are left out, see StatsGen.run_reports                             *
+    *                                                                                           *
+    * Parameters:       pandas dataframe           data_frame    :  Orders from the database    *
+    *                   {(int, int): EbayReport}   month_buckets :  Monthly reports keyed by    *
+    *                                                               (year, month), reports for  *
+    *                                                               new months get added to it  *
+    *                   {(int, int)}               skip_months   :  Months whose reports should *
+    *                                                               not get the orders          *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def add_orders(self, data_frame, month_buckets, skip_months=()):
+        for item in data_frame['Item title'].fillna('').unique():
+            self.item_man.visit_item(item)
+
+        orders = attach_item_costs(data_frame, self.item_man)
+        orders = FrameOrders(orders[(orders['Order date'] <= pd.Timestamp(self.run_context.today)).to_numpy()])
+
+        for key in orders.get_months():
+            if key in skip_months:
+                continue
+
+            if key not in month_buckets:
+                month_buckets[key] = self.create_monthly_report(*key)
+
+            month_buckets[key].add_frame(orders)
+
+        for report in self.relative_reports:
+            report.add_frame(orders)
+
+'''
+* ***************************************************************************************** *
+*                                                                                           *
+* Class name:       StreamStatsGen                                                          *
+*                                                                                           *
+* Description:      Generates the same reports as FrameStatsGen from an iterable of         *
+*                   dataframe chunks, such as the ones from stream_ebay_reports or          *
+*                   stream_csv_database, so only one chunk is held in memory at a time      *
+*                                                                                           *
+* Parameters:      [str]              header   : The columns of the chunks                  *
+*                  [pandas dataframe] chunks   : Orders to run the reports on               *
+*                  ItemManager        item_man : The class responsible for keeping track of *
+*                                                item costs and if an item should be counted*
+*                  RunContext      run_context : See StatsGen                               *
+*                  str             costs_dir   : See StatsGen                               *
+*                                                                                           *
+* ***************************************************************************************** *
+'''
+class StreamStatsGen(FrameStatsGen):
+    def __init__(self, header, chunks, item_man, run_context=None, costs_dir='./'):
+        StatsGen.__init__(self, header, chunks, item_man, run_context, costs_dir)
+
+    '''
+    * ***************************************************************************************** *
+    *                                                                                           *
+    * Function name:    run_reports                                                             *
+    *                                                                                           *
+    * Description:      Ingests every chunk into the full report, the monthly reports and the   *
+    *                   relative reports                                                        *
+    *                                                                                           *
+    * Return Value:     none                                                                    *
+    *                                                                                           *
+    * ***************************************************************************************** *
+    '''
+    def run_reports(self):
+        if self.reports_run:
+            return
+
+        month_buckets = {}
+        for chunk in self.table:
+            self.add_orders(chunk, month_buckets)
+
+        self.set_monthly_reports(month_buckets)
+        self.reports_run = True
+
 if __name__ == "__main__":
     # TODO: fix a bug where if you drop in a new report, it cannot be merged because
     # update_csv_database sorts the dataframe by date and ebay.csv's dates are in a different format
@@ -545,27 +2616,60 @@ if __name__ == "__main__":
     Also want to save statistics to a text file each run.
     
     '''
-    update_csv_database()
-    
-    infile = open('ebay.csv', 'r')
-    incsv = csv.reader(infile, delimiter=",", quotechar='"')
-    inheader = incsv.__next__()
+    # --compact rewrites the whole database instead of only adding the new orders to it
+    # --workers N parses new reports in N processes
+    workers = 1
+    if '--workers' in sys.argv:
+        workers = int(sys.argv[sys.argv.index('--workers') + 1])
+
+    # --today YYYY-MM-DD runs the reports as if it were that day
+    if '--today' in sys.argv:
+        run_context = dateParser.RunContext(dateParser.parse_date(sys.argv[sys.argv.index('--today') + 1]))
+    else:
+        run_context = dateParser.RunContext()
+    dateParser.set_run_context(run_context)
+
+    # --frame runs the reports on the whole database dataframe instead of row by row, and --stream
+    # runs them straight from the ebay reports a chunk at a time without touching the database
+    if '--stream' in sys.argv:
+        report_files = sorted(glob.glob('./ebay_reports/*.csv'))
+        if not report_files:
+            print('No ebay reports found in ./ebay_reports/')
+            sys.exit(1)
+
+        inheader = read_csv_header(report_files[0], skiprows=11)
+        item_mngr = itemManager.ItemManager(header=inheader, run_context=run_context)
+
+        stats = StreamStatsGen(inheader, stream_ebay_reports(report_files), item_mngr, run_context)
+    else:
+        update_csv_database(compact='--compact' in sys.argv, workers=workers)
+
+        inheader = read_csv_header('ebay.csv')
+        item_mngr = itemManager.ItemManager(header=inheader, run_context=run_context)
+
+        # The database comes from the .npz cache when it is up to date, so the csv is not parsed
+        if '--frame' in sys.argv:
+            stats = FrameStatsGen(load_csv_database(), item_mngr, run_context)
+        else:
+            stats = StatsGen(inheader, load_csv_database(), item_mngr, run_context)
+        stats.set_report_store(REPORT_STORE_FILENAME)
 
-    item_mngr = itemManager.ItemManager(header=inheader)
-    indataset = [row for row in incsv]
-    
-    stats = StatsGen(inheader, indataset, item_mngr)
     stats.set_sales_offset(554 + 492.34 + 1196 + 1065)
 
     print('MONTHLY REPORTS(This year):')
     print('======================================================================')
     stats.run_monthly_reports()
-    stats.print_monthly_reports(datetime.datetime.now().year)
+    stats.print_monthly_reports(run_context.today.year)
+
+    print('QUARTERLY REPORTS(This year):')
+    print('======================================================================')
+    stats.print_quarterly_reports(run_context.today.year)
+
+    print('YEARLY REPORTS:')
+    print('======================================================================')
+    stats.print_yearly_reports()
 
     print('RELATIVE REPORTS:')
     print('======================================================================')
     stats.run_relative_reports()
     stats.print_relative_reports()
-    
-
-    infile.close()
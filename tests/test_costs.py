@@ -0,0 +1,91 @@
+import datetime
+
+import costs
+import dateParser
+import itemManager
+import reportRunner
+
+
+HEADER = 'Date,Website,Item,Cost/unit,Has tax,Tax,Total cost,Quantity,Total\n'
+
+
+def write_costs(tmp_path, rows):
+    (tmp_path / 'costs.csv').write_text(HEADER + ''.join(row + '\n' for row in rows))
+
+
+def test_ledger_append_and_reload(tmp_path):
+    ledger = costs.CostsLedger(str(tmp_path) + '/')
+    assert ledger.dataset == []
+    assert ledger.total == 0.0
+
+    ledger.append_row(['01/05/2024', 'shop.com', 'Tape', 2.0, 'n', 0.0, 2.0, 3, 6.0])
+    ledger.append_row(['01/07/2024', 'other.com', 'Boxes', 1.0, 'n', 0.0, 1.0, 10, 10.0])
+    ledger.append_row(['02/01/2024', 'tape.com', 'Tape', 2.5, 'n', 0.0, 2.5, 2, 5.0])
+
+    assert ledger.total == 21.0
+    assert ledger.get_items() == ['Boxes', 'Tape']
+    assert ledger.get_last_purchase('Tape')[ledger.website_i] == 'tape.com'
+    assert ledger.get_last_purchase(' Boxes ')[ledger.website_i] == 'other.com'
+    assert ledger.get_last_purchase('Glue') is None
+
+    # The header is only written once, and the rows read back the same
+    lines = (tmp_path / 'costs.csv').read_text().splitlines()
+    assert lines[0] + '\n' == HEADER
+    assert len(lines) == 4
+
+    reloaded = costs.CostsLedger(str(tmp_path) + '/')
+    assert reloaded.total == 21.0
+    assert reloaded.get_last_purchase('Tape')[reloaded.website_i] == 'tape.com'
+
+    reloaded.append_row(['02/03/2024', 'shop.com', 'Glue', 4.0, 'n', 0.0, 4.0, 1, 4.0])
+    assert reloaded.total == 25.0
+    assert costs.CostsLedger(str(tmp_path) + '/').total == 25.0
+
+
+def test_daily_costs_range_sums(tmp_path):
+    write_costs(tmp_path, ['01/05/2024,shop.com,Tape,2,n,0,2,3,6',
+                           '01/05/2024,shop.com,Glue,4,n,0,4,1,4',
+                           '01/08/2024,shop.com,Boxes,1,n,0,1,10,10',
+                           '01/20/2024,shop.com,Tape,2,n,0,2,1,2'])
+    daily_costs = costs.DailyCosts(costs.CostsLedger(str(tmp_path) + '/'))
+
+    assert daily_costs.total == 22.0
+
+    # The first and last days of the ledger, on their own and at the ends of a range
+    assert daily_costs.get_total(datetime.date(2024, 1, 5), datetime.date(2024, 1, 5)) == 10.0
+    assert daily_costs.get_total(datetime.date(2024, 1, 20), datetime.date(2024, 1, 20)) == 2.0
+    assert daily_costs.get_total(datetime.date(2024, 1, 5), datetime.date(2024, 1, 20)) == 22.0
+    assert daily_costs.get_total(datetime.date(2024, 1, 6), datetime.date(2024, 1, 19)) == 10.0
+    assert daily_costs.get_total(datetime.date(2023, 1, 1), datetime.date(2025, 1, 1)) == 22.0
+
+    # Ranges without any costs, backwards ranges and ranges outside of the ledger
+    assert daily_costs.get_total(datetime.date(2024, 1, 9), datetime.date(2024, 1, 19)) == 0.0
+    assert daily_costs.get_total(datetime.date(2024, 1, 20), datetime.date(2024, 1, 5)) == 0.0
+    assert daily_costs.get_total(datetime.date(2023, 1, 1), datetime.date(2024, 1, 4)) == 0.0
+    assert daily_costs.get_total(datetime.date(2024, 1, 21), datetime.date(2025, 1, 1)) == 0.0
+
+
+def test_daily_costs_empty_ledger(tmp_path):
+    daily_costs = costs.DailyCosts(costs.CostsLedger(str(tmp_path) + '/'))
+
+    assert daily_costs.total == 0.0
+    assert daily_costs.get_total(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)) == 0.0
+
+
+def test_materials_costs_future_and_unreadable_dates(tmp_path):
+    write_costs(tmp_path, ['01/05/2024,shop.com,Tape,2,n,0,2,3,6',
+                           '01/31/2024,shop.com,Tape,2,n,0,2,1,2',
+                           '2024-13-45,shop.com,Glue,4,n,0,4,1,4',
+                           '03/01/2024,shop.com,Boxes,1,n,0,1,10,10'])
+    run_context = dateParser.RunContext(datetime.date(2024, 2, 15))
+    item_man = itemManager.ItemManager(['Item title'], csv_dir=str(tmp_path) + '/', run_context=run_context)
+
+    stats = reportRunner.StatsGen(reportRunner.REPORT_COLUMNS, [], item_man, run_context, costs_dir=str(tmp_path) + '/')
+    stats.run_reports()
+
+    # The all time total is the whole ledger, like the total shown by costs.py
+    assert stats.full_report.materials_costs == 22.0
+
+    # Dated reports only get the costs with a readable date in their range
+    assert stats.ytd_report.materials_costs == 8.0
+    assert stats.month_report.materials_costs == 2.0
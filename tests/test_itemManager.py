@@ -0,0 +1,79 @@
+import datetime
+
+import pytest
+
+import dateParser
+import itemManager
+
+
+@pytest.fixture
+def item_man(tmp_path, monkeypatch):
+    monkeypatch.setattr(itemManager, 'clear', lambda: None)
+
+    item_man = itemManager.ItemManager(['Item title'], csv_dir=str(tmp_path) + '/',
+                                       run_context=dateParser.RunContext(datetime.date(2024, 6, 1)))
+    item_man.visit_item('Widget')
+    item_man.update_valid_items()
+
+    return item_man
+
+
+def feed_input(monkeypatch, answers):
+    answers = iter(answers)
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+
+
+def test_define_costs_reprompts_on_bad_date(item_man, monkeypatch):
+    # Add costs for new items, then a typo for the end date before 'present', then exit
+    feed_input(monkeypatch, ['2', '5', '01-22-2024', '01-222-2024', 'present', '0'])
+
+    item_man.run_define_costs()
+
+    assert item_man.lookup_table == [['Widget', '5', '2024-01-22', 'present']]
+    assert float(item_man.get_cost('Widget', datetime.date(2024, 2, 1))) == 5.0
+    assert item_man.new_items == set()
+
+
+def test_input_date_formats(monkeypatch):
+    feed_input(monkeypatch, ['not a date', '2024-13-01', '2024-03-05'])
+    assert itemManager.input_date('>> ') == '2024-03-05'
+
+    feed_input(monkeypatch, ['03-05-2024'])
+    assert itemManager.input_date('>> ') == '2024-03-05'
+
+    feed_input(monkeypatch, [' present '])
+    assert itemManager.input_date('>> ') == 'present'
+
+
+def test_empty_tables_load(tmp_path, monkeypatch):
+    (tmp_path / 'item_lookup_table.csv').write_text('')
+    (tmp_path / 'item_alias_table.csv').write_text('')
+
+    item_man = itemManager.ItemManager(['Item title'], csv_dir=str(tmp_path) + '/',
+                                       run_context=dateParser.RunContext(datetime.date(2024, 6, 1)))
+
+    assert item_man.lookup_table == []
+    assert item_man.alias_table == []
+    assert item_man.get_cost('Widget', datetime.date(2024, 2, 1)) == -1
+
+
+def test_unreadable_dates_are_reported(tmp_path, capsys):
+    (tmp_path / 'item_lookup_table.csv').write_text('Item,Cost,Start Date,End Date\n'
+                                                   'Widget,5,2024-01-01,present\n'
+                                                   'Gadget,3,01-22-2024,present\n'
+                                                   'Gadget,4,2024-01-01,2024-13-01\n')
+    (tmp_path / 'item_alias_table.csv').write_text('Item,Alias\n')
+
+    item_man = itemManager.ItemManager(['Item title'], csv_dir=str(tmp_path) + '/',
+                                       run_context=dateParser.RunContext(datetime.date(2024, 6, 1)))
+
+    assert 'unreadable' in capsys.readouterr().out
+    assert item_man.find_range_problems() == [['Gadget', 'unreadable', '01-22-2024', 'present'],
+                                              ['Gadget', 'unreadable', '2024-01-01', '2024-13-01']]
+
+    item_man.visit_item('Widget')
+    item_man.visit_item('Gadget')
+    item_man.update_valid_items()
+
+    assert float(item_man.get_cost('Widget', datetime.date(2024, 2, 1))) == 5.0
+    assert item_man.get_cost('Gadget', datetime.date(2024, 2, 1)) == -1